@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+benchmarks.py - Micro-benchmarks on synthetic data (no Tastytrade session needed)
+
+    python benchmarks.py              # todos
+    python benchmarks.py startup      # arranque en frío + órdenes simuladas (exit 1 si algo falla)
+    python benchmarks.py plans        # planes de consulta en una DB migrada (exit 1 si hay SCAN trades)
+"""
+import ast
+import datetime
+import asyncio
+import subprocess
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from tastytrade.dxfeed import Greeks, Summary
+
+from option_surface import OptionSurface
+from query_plans import check_query_plans, temporary_db
+from utils import format_data
+
+
+def synthetic_chain(n_contracts, start=datetime.date(2026, 1, 2)):
+    """A cached-chain stand-in with n_contracts calls/puts spread over 20 expirations."""
+    index = {}
+    per_expiration = max(n_contracts // 40, 1)
+    for e in range(20):
+        exp_date = start + datetime.timedelta(days=e)
+        code = exp_date.strftime("%y%m%d")
+        for k in range(per_expiration):
+            strike = 4000 + 5 * k
+            for option_type in ("C", "P"):
+                index[(exp_date, float(strike), option_type)] = (
+                    f"{strike}.0",
+                    f"SPXW  {code}{option_type}0{strike}000",
+                    f".SPXW{code}{option_type}{strike}",
+                )
+    return SimpleNamespace(index=index)
+
+
+def synthetic_events(surface):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    quotes, greeks, summaries = [], [], []
+    for option, symbol in zip(surface.option, surface.symbol):
+        quotes.append(SimpleNamespace(symbol=option, ask=1.1, ask_size=10, bid=1.0, bid_size=10,
+                                      mid=1.05, last=1.05, updated_at=now))
+        greeks.append(SimpleNamespace(event_symbol=symbol, delta=0.5, gamma=0.01, theta=-0.1,
+                                      vega=0.2, rho=0.01, volatility=0.15, price=1.05))
+        summaries.append(SimpleNamespace(event_symbol=symbol, open_interest=100))
+    return quotes, greeks, summaries
+
+
+def legacy_route(greeks_list, symbol_pairs, event):
+    """The pre-index routing of collect_events: scan symbol_pairs, then greeks_list."""
+    for _, tasty_symbol in symbol_pairs:
+        if event.event_symbol == tasty_symbol:
+            for d in greeks_list:
+                if d.get("symbol") == tasty_symbol:
+                    d["delta"] = str(event.delta)
+                    break
+            break
+
+
+def bench_event_routing(sizes=(1_000, 5_000, 10_000, 20_000), legacy_max=5_000):
+    print("Event routing (build records + quotes + Greeks + Summary)")
+    print(f"{'contracts':>10} {'total ms':>10} {'us/contract':>12} {'legacy ms':>10}")
+    for n in sizes:
+        chain = synthetic_chain(n)
+        start = min(key[0] for key in chain.index)
+        end = max(key[0] for key in chain.index)
+
+        t0 = time.perf_counter()
+        surface = OptionSurface.from_chains([chain], start, end, "0", "100000")
+        elapsed = time.perf_counter() - t0
+
+        quotes, greeks, summaries = synthetic_events(surface)
+        t1 = time.perf_counter()
+        surface.apply_market_data(quotes)
+        for event in greeks:
+            surface.apply_event(Greeks, event)
+        for event in summaries:
+            surface.apply_event(Summary, event)
+        elapsed += time.perf_counter() - t1
+
+        legacy = "-"
+        if n <= legacy_max:
+            greeks_list = surface.to_records()
+            symbol_pairs = list(zip(surface.option, surface.symbol))
+            t2 = time.perf_counter()
+            for event in greeks:
+                legacy_route(greeks_list, symbol_pairs, event)
+            legacy = f"{(time.perf_counter() - t2) * 1000:.0f}"
+
+        print(f"{len(surface):>10} {elapsed * 1000:>10.1f} {elapsed / len(surface) * 1e6:>12.2f} {legacy:>10}")
+
+
+def legacy_format_data(gr_list, today_ddt):
+    """utils.format_data before vectorizing: one Python iteration and Timestamp per row."""
+    import pandas as pd
+    import numpy as np
+    import datetime
+
+    columns = [
+        "calls", "call_iv", "call_open_int", "call_delta", "call_gamma",
+        "puts", "put_iv", "put_open_int", "put_delta", "put_gamma",
+        "strike_price", "expiration_date", "time_till_exp"
+    ]
+
+    grouped = {}
+
+    for option in gr_list:
+        strike = float(option["strike"])
+        raw_expiration = pd.to_datetime(option["expiration"])
+        expiration = pd.Timestamp(
+            datetime.datetime.combine(raw_expiration, datetime.time(16, 0))
+        ).tz_localize("America/New_York")
+
+        # Usamos una base común eliminando solo la letra final C/P
+        option_code = str(option["option"]).replace(' ', '')
+        option_base = option_code[:-9] + option_code[-8:]  # elimina la C/P (ej: SPXW25071806250000)
+
+        if "/" in option_base:
+            option_base = option_base.replace("C", '')
+            option_base = option_base.replace("P", '')
+
+        key = (option_base, strike, expiration)
+
+        if key not in grouped:
+            grouped[key] = {
+                "strike_price": strike,
+                "expiration_date": expiration,
+                "time_till_exp": None,  # se completará luego
+                "calls": None,
+                "call_iv": None,
+                "call_open_int": None,
+                "call_delta": None,
+                "call_gamma": None,
+                "puts": None,
+                "put_iv": None,
+                "put_open_int": None,
+                "put_delta": None,
+                "put_gamma": None,
+            }
+
+        is_call = "C" in option["option"]
+
+        if is_call:
+            grouped[key]["calls"] = option_code
+            grouped[key]["call_iv"] = float(option.get("vol", 0))
+            grouped[key]["call_open_int"] = float(option.get("open_interest", 0))
+            grouped[key]["call_delta"] = float(option.get("delta", 0))
+            grouped[key]["call_gamma"] = float(option.get("gamma", 0))
+        else:
+            grouped[key]["puts"] = option_code
+            grouped[key]["put_iv"] = float(option.get("vol", 0))
+            grouped[key]["put_open_int"] = float(option.get("open_interest", 0))
+            grouped[key]["put_delta"] = float(option.get("delta", 0))
+            grouped[key]["put_gamma"] = float(option.get("gamma", 0))
+
+    # Crear DataFrame
+    option_data = pd.DataFrame(grouped.values(), columns=columns)
+    # Calcular DTE (sin zona horaria)
+    expiration_dates = pd.to_datetime(option_data["expiration_date"].dt.tz_localize(None)).values.astype("datetime64[D]")
+    busday_counts = np.busday_count(today_ddt.date(), expiration_dates)
+    option_data["time_till_exp"] = np.where(busday_counts == 0, 1 / 252, busday_counts / 252)
+
+    # Ordenar
+    option_data = option_data.sort_values(by=["expiration_date", "strike_price"]).reset_index(drop=True)
+
+    return option_data
+
+
+def synthetic_surface(n_contracts):
+    chain = synthetic_chain(n_contracts)
+    start = min(key[0] for key in chain.index)
+    end = max(key[0] for key in chain.index)
+    surface = OptionSurface.from_chains([chain], start, end, "0", "100000")
+    quotes, greeks, summaries = synthetic_events(surface)
+    surface.apply_market_data(quotes)
+    for event in greeks:
+        surface.apply_event(Greeks, event)
+    for event in summaries:
+        surface.apply_event(Summary, event)
+    return surface
+
+
+def bench_format_data(sizes=(1_000, 20_000)):
+    print("format_data (call/put pivot + expiration + DTE)")
+    print(f"{'rows':>10} {'legacy ms':>10} {'dicts ms':>10} {'surface ms':>11} {'same':>6}")
+    today = datetime.datetime(2026, 1, 2, 9, 30)
+    for n in sizes:
+        surface = synthetic_surface(n)
+        records = surface.to_records()
+
+        t0 = time.perf_counter()
+        legacy = legacy_format_data(records, today)
+        t1 = time.perf_counter()
+        from_dicts = format_data(records, today)
+        t2 = time.perf_counter()
+        from_surface = format_data(surface, today)
+        t3 = time.perf_counter()
+
+        same = from_dicts.equals(legacy) and from_surface.equals(legacy)
+        print(f"{len(records):>10} {(t1 - t0) * 1000:>10.1f} {(t2 - t1) * 1000:>10.1f} {(t3 - t2) * 1000:>11.1f} {str(same):>6}")
+
+
+# Budget for trade_tracker's own module-level imports (db_*, trading_hours, stats_calculator),
+# timed in a fresh interpreter after its third-party imports. discord alone takes ~600 ms and
+# varies by more than that between runs, so it is measured apart and not budgeted. Measured:
+# ~4.5 ms; importing the Tastytrade SDK or pandas at startup again costs hundreds of ms.
+STARTUP_BUDGET_MS = 50
+# Heavy modules that must only load after the bot is connected (trade_tracker.load_market())
+STARTUP_DEFERRED = ("tastytrade", "pandas", "numpy", "exchange_calendars", "holidays")
+
+
+def entry_point_imports(path=Path(__file__).with_name("trade_tracker.py")):
+    """The module-level imports of the bot as (third-party, project) source, without loading them here."""
+    tree = ast.parse(Path(path).read_text())
+    third_party, project = [], []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            module = node.module if isinstance(node, ast.ImportFrom) else node.names[0].name
+            is_project = Path(path).with_name(module.split(".")[0] + ".py").exists()
+            (project if is_project else third_party).append(ast.unparse(node))
+    return "\n".join(third_party), "\n".join(project)
+
+
+def bench_cold_start(runs=5, budget_ms=STARTUP_BUDGET_MS):
+    third_party, project = entry_point_imports()
+    code = (f"{third_party}\nimport sys, time\n_t0 = time.perf_counter()\n{project}\n"
+            "print((time.perf_counter() - _t0) * 1000)\nprint(' '.join(sys.modules))")
+    cwd = Path(__file__).parent
+
+    wall, own = [], []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True)
+        wall.append((time.perf_counter() - t0) * 1000)
+        own_ms, modules = proc.stdout.split("\n", 1)
+        own.append(float(own_ms))
+    loaded = set(modules.split())
+
+    # Perfil -X importtime: imports de primer nivel por tiempo acumulado
+    profile = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd,
+                             capture_output=True, text=True, check=True).stderr
+    top = []
+    for line in profile.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and not parts[2].startswith("  ") and parts[1].strip().isdigit():
+            top.append((int(parts[1]), parts[2].strip()))
+    top.sort(reverse=True)
+
+    print(f"Cold start (trade_tracker imports): project {min(own):.1f} ms best of {runs}, budget {budget_ms} ms; "
+          f"{min(wall):.0f} ms with discord & co.")
+    for cumulative, name in top[:8]:
+        print(f"{cumulative / 1000:>10.1f} ms  {name}")
+
+    early = [name for name in STARTUP_DEFERRED if name in loaded]
+    if early:
+        print(f"FAIL: loaded at startup: {', '.join(early)}")
+    if min(own) > budget_ms:
+        print("FAIL: over budget")
+    return not early and min(own) <= budget_ms
+
+
+# (command, args) run through order_command; each must answer with an order embed
+ORDER_SMOKE_COMMANDS = [
+    ("BTO", ("SPY", "@", "m")),
+    ("STC", ("SPY", "@", "100")),
+    ("BTO", ("SPX", "2/12/26", "6900C", "@", "m")),
+    ("STC", ("SPX", "2/12/26", "6900C", "@", "m", "trim")),
+    ("STC", ("SPX", "2/12/26", "6900C", "@", "m")),
+]
+
+
+def check_order_commands(commands=ORDER_SMOKE_COMMANDS):
+    """Run order commands end to end on a temporary DB with a fake market.
+
+    Market data is stubbed (load_market), so this needs no Tastytrade session, but the
+    command bodies, the lazy market accessor and the DB writes run for real.
+    """
+    import db_async
+    import trade_tracker
+
+    async def fake_quote(session, symbol):
+        return {"mid": "100.00", "last": "100.00"}
+
+    async def fake_tasty_data(session, options_requested=None, equities_ticker=[], as_surface=False):
+        strike = options_requested["lower_strike"]
+        return [{"strike": strike, "symbol": f".SPXW260212C{strike}", "ticker": "SPXW",
+                 "mid": "10.00", "last": "10.00"}], {}
+
+    fake = SimpleNamespace(
+        tasty=SimpleNamespace(quote_cache=SimpleNamespace(get=fake_quote), tasty_data=fake_tasty_data),
+        session=None,
+    )
+
+    async def load_market():
+        return fake
+
+    async def run():
+        failures = []
+        for command, args in commands:
+            sent = []
+
+            async def send(content=None, embed=None):
+                sent.append(embed.title if embed else content)
+
+            ctx = SimpleNamespace(invoked_with=command, author=SimpleNamespace(name="benchmark"), send=send)
+            await trade_tracker.order_command.callback(ctx, *args)
+            ok = any(str(m).startswith(f"{command} ") and "Order by" in str(m) for m in sent)
+            print(f"{'ok' if ok else 'FAIL':>4}  {command} {' '.join(args)}")
+            if not ok:
+                failures.append((command, args, sent))
+        return failures
+
+    originals = (trade_tracker.load_market, trade_tracker.validate_trading_hours)
+    with temporary_db():
+        trade_tracker.load_market = load_market
+        trade_tracker.validate_trading_hours = lambda symbol, trade_type=None: (True, "")
+        try:
+            print("Order commands (fake market, temporary DB)")
+            failures = asyncio.run(run())
+        finally:
+            db_async.shutdown()
+            trade_tracker.load_market, trade_tracker.validate_trading_hours = originals
+
+    for command, args, sent in failures:
+        print(f"FAIL: {command} {' '.join(args)} -> {sent}")
+    return not failures
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["plans"]:
+        sys.exit(0 if check_query_plans() else 1)
+    if sys.argv[1:] == ["startup"]:
+        startup_ok = bench_cold_start()
+        print()
+        sys.exit(0 if check_order_commands() and startup_ok else 1)
+    bench_event_routing()
+    print()
+    bench_format_data()
+    print()
+    bench_cold_start()
+    print()
+    check_query_plans()
+    print()
+    check_order_commands()
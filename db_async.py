@@ -0,0 +1,69 @@
+"""
+db_async.py - Awaitable facade over db_handler for the Discord event loop
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import db_handler
+
+# One writer thread serializes every write, so SQLite never sees two writers competing
+# for the lock. Reads go to a small pool and, with WAL, run while the writer commits.
+# Each worker thread keeps its own pooled connection (see db_handler.get_db_connection).
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+_readers = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db-reader")
+
+async def _run(executor, func, *args, **kwargs):
+    """Run a blocking db_handler call on `executor` without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+# Writes
+async def open_trade(*args, **kwargs):
+    return await _run(_writer, db_handler.open_trade, *args, **kwargs)
+
+async def avg_down_trade(*args, **kwargs):
+    return await _run(_writer, db_handler.avg_down_trade, *args, **kwargs)
+
+async def trim_trade(*args, **kwargs):
+    return await _run(_writer, db_handler.trim_trade, *args, **kwargs)
+
+async def close_trade(*args, **kwargs):
+    return await _run(_writer, db_handler.close_trade, *args, **kwargs)
+
+async def close_trades(*args, **kwargs):
+    return await _run(_writer, db_handler.close_trades, *args, **kwargs)
+
+async def rebuild_aggregates(*args, **kwargs):
+    return await _run(_writer, db_handler.rebuild_aggregates, *args, **kwargs)
+
+async def refresh_leaderboard(*args, **kwargs):
+    return await _run(_writer, db_handler.refresh_leaderboard, *args, **kwargs)
+
+# Reads
+async def is_trade_open(*args, **kwargs):
+    return await _run(_readers, db_handler.is_trade_open, *args, **kwargs)
+
+async def get_trade_stats(*args, **kwargs):
+    return await _run(_readers, db_handler.get_trade_stats, *args, **kwargs)
+
+async def get_user_aggregates(*args, **kwargs):
+    return await _run(_readers, db_handler.get_user_aggregates, *args, **kwargs)
+
+async def get_leaderboard(*args, **kwargs):
+    return await _run(_readers, db_handler.get_leaderboard, *args, **kwargs)
+
+async def get_equity_stats(*args, **kwargs):
+    return await _run(_readers, db_handler.get_equity_stats, *args, **kwargs)
+
+async def get_bucketed_stats(*args, **kwargs):
+    return await _run(_readers, db_handler.get_bucketed_stats, *args, **kwargs)
+
+async def get_open_options_expiring_today(*args, **kwargs):
+    return await _run(_readers, db_handler.get_open_options_expiring_today, *args, **kwargs)
+
+def shutdown():
+    """Wait for queued calls to finish, then close every pooled connection."""
+    _writer.shutdown(wait=True)
+    _readers.shutdown(wait=True)
+    db_handler.close_db_connections()
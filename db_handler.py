@@ -1,85 +1,671 @@
 import sqlite3
-from datetime import datetime, timedelta, time
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, time
 
-def get_db_connection():
-    """Create a new database connection."""
-    conn = sqlite3.connect('trades.db')
+from equity_curve import equity_by_class
+from stats_calculator import trade_pnl
+
+DB_PATH = 'trades.db'
+
+# Database-wide setting, persisted in the file: applied once per process.
+JOURNAL_PRAGMA = "PRAGMA journal_mode=WAL"
+
+# Per-connection settings, applied when a pooled connection is created.
+# WAL + synchronous=NORMAL only fsyncs on checkpoints instead of every commit.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",     # ~16 MB page cache
+    "PRAGMA mmap_size=268435456",   # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",     # wait for a concurrent writer instead of failing
+)
+
+_connections = {}  # thread id -> sqlite3.Connection
+_connections_lock = threading.Lock()
+_journal_configured = False
+
+def _create_connection():
+    """Open a connection to DB_PATH and apply the pragmas."""
+    global _journal_configured
+    # check_same_thread=False only so close_db_connections() can close it from another thread;
+    # every connection is still used by the thread that created it.
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row  # Allows accessing columns by name
+    if not _journal_configured:
+        conn.execute(JOURNAL_PRAGMA)
+        _journal_configured = True
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def initialize_db():
-    """Initialize the database and create the trades table if it doesn't exist."""
+def get_db_connection():
+    """Return the long-lived connection of the calling thread, creating it on first use.
+
+    Connections are kept open and reused, so `with get_db_connection() as conn:` only
+    commits (or rolls back) the transaction, it does not close the connection.
+    """
+    thread_id = threading.get_ident()
+    conn = _connections.get(thread_id)
+    if conn is None:
+        with _connections_lock:
+            conn = _connections.get(thread_id)
+            if conn is None:
+                conn = _create_connection()
+                _connections[thread_id] = conn
+    return conn
+
+def close_db_connections():
+    """Close every pooled connection (on shutdown or before switching DB_PATH)."""
+    global _journal_configured
+    with _connections_lock:
+        for conn in _connections.values():
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+        _journal_configured = False
+
+def parse_option_date(date_str):
+    """Parse an option date typed as M/D/YY (or M/D/YYYY, zero padded or not)."""
+    try:
+        month, day, year = (int(part) for part in date_str.strip().split('/'))
+        # Agregar siglo si es necesario
+        if year < 100:
+            year = 2000 + year if year < 50 else 1900 + year
+        return datetime(year, month, day).date()
+    except (AttributeError, ValueError) as e:
+        raise ValueError(f"Cannot parse date: {date_str}") from e
+
+def to_iso_expiration(date_str):
+    """Return the YYYY-MM-DD expiration for an option date, or None if it can't be parsed."""
+    if not date_str:
+        return None
+    try:
+        return parse_option_date(date_str).isoformat()
+    except ValueError:
+        return None
+
+# Managed idx_trades_* indexes, keyed by name, as of each migration that changed them.
+# sync_indexes() makes the database match one of these sets: other idx_trades_* indexes
+# are dropped and changed definitions rebuilt. Never edit a set an applied migration
+# uses; add a new set and a migration that syncs it.
+INDEXES_V4 = {
+    # is_trade_open / open_trade / trim_trade / avg_down_trade / close_trade.
+    # UNIQUE so a position can only be open once (NULL date/strike/type compare as '').
+    "idx_trades_open_position":
+        "CREATE UNIQUE INDEX idx_trades_open_position ON trades(user, ticker, IFNULL(date, ''), IFNULL(strike, ''), IFNULL(type, '')) WHERE opened=1",
+    # get_open_options_expiring_today
+    "idx_trades_open_expiration":
+        "CREATE INDEX idx_trades_open_expiration ON trades(expiration) WHERE opened=1",
+    # get_trade_stats
+    "idx_trades_user_timestamp":
+        "CREATE INDEX idx_trades_user_timestamp ON trades(user, timestamp)",
+}
+INDEXES_V5 = {
+    **INDEXES_V4,
+    # get_user_aggregates (best/worst trades), on the pnl column added by migration 5
+    "idx_trades_user_pnl":
+        "CREATE INDEX idx_trades_user_pnl ON trades(user, pnl) WHERE opened=0",
+}
+INDEXES_V7 = {
+    **INDEXES_V5,
+    # iter_closed_pnl (equity curve, in closing order) / get_bucketed_stats
+    "idx_trades_user_closed":
+        "CREATE INDEX idx_trades_user_closed ON trades(user, closed_timestamp) WHERE opened=0",
+}
+# The current set
+TRADE_INDEXES = INDEXES_V7
+
+# Representative lookups that must be served by an index (see check_query_plans).
+QUERY_PLAN_CHECKS = [
+    ("open position (stock/future)",
+     "SELECT id FROM trades WHERE user=? AND ticker=? AND opened=1 AND type=?",
+     ("user", "SPY", "L")),
+    ("open position (option)",
+     "SELECT id FROM trades WHERE user=? AND ticker=? AND opened=1 AND date=? AND strike=? AND type=?",
+     ("user", "SPX", "2/12/26", "6900", "C")),
+    ("expiring options",
+     "SELECT user FROM trades WHERE opened=1 AND expiration <= ? AND type IN ('C', 'P')",
+     ("2026-01-01",)),
+    ("stats window",
+     "SELECT * FROM trades WHERE user=? AND timestamp >= ? AND opened=0",
+     ("user", "1970-01-01 00:00:00")),
+    ("best trades",
+     "SELECT id FROM trades WHERE user=? AND opened=0 AND pnl IS NOT NULL ORDER BY pnl DESC, id LIMIT 3",
+     ("user",)),
+    ("closed in range",
+     "SELECT pnl FROM trades WHERE user=? AND opened=0 AND closed_timestamp >= ? AND closed_timestamp < ?",
+     ("user", "2026-01-01", "2026-02-01")),
+    ("equity curve",
+     "SELECT pnl FROM trades WHERE user=? AND opened=0 AND pnl IS NOT NULL ORDER BY closed_timestamp, id",
+     ("user",)),
+]
+
+def sync_indexes(cursor, indexes=TRADE_INDEXES):
+    """Create missing managed indexes, rebuild changed ones and drop stale ones.
+
+    A definition that cannot be built raises, so the migration running it is rolled back.
+    """
+    cursor.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name='trades' AND name LIKE 'idx_trades_%'"
+    )
+    existing = {row[0]: row[1] for row in cursor.fetchall()}
+
+    for name, sql in existing.items():
+        if indexes.get(name) != sql:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+
+    for name, sql in indexes.items():
+        if existing.get(name) != sql:
+            cursor.execute(sql)
+
+def explain_query_plan(query, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for a query."""
     with get_db_connection() as conn:
         cursor = conn.cursor()
+        cursor.execute(f'EXPLAIN QUERY PLAN {query}', params)
+        return [row[3] for row in cursor.fetchall()]
+
+def check_query_plans():
+    """Return {label: plan} for every QUERY_PLAN_CHECKS query that scans the whole trades table."""
+    regressions = {}
+    for label, query, params in QUERY_PLAN_CHECKS:
+        plan = explain_query_plan(query, params)
+        if any(detail.startswith('SCAN trades') for detail in plan):
+            regressions[label] = plan
+    return regressions
+
+# Fixed-slot columns replaced by the fills table
+LEGACY_FILL_COLUMNS = (
+    'avg_down1', 'avg_down1_qty', 'avg_down2', 'avg_down2_qty',
+    'trim1', 'trim2', 'trim3', 'trim4',
+)
+
+def rebuild_trade_averages(cursor, trade_ids=None):
+    """Recompute the entry/exit aggregates of trades from their fills.
+
+    open_trade and the other mutators maintain these columns incrementally; this is the
+    reference computation (one aggregate per trade over idx_fills_trade_id), used by the
+    migration and to repair rows. An exit average falls back to the latest exit price
+    while no sized exit exists.
+    """
+    query = '''
+    UPDATE trades SET
+        entry_qty = (SELECT IFNULL(SUM(qty), 0) FROM fills WHERE trade_id=trades.id AND side='entry'),
+        entry_avg = (SELECT SUM(price * qty) / NULLIF(SUM(qty), 0) FROM fills WHERE trade_id=trades.id AND side='entry'),
+        exit_qty = (SELECT IFNULL(SUM(qty), 0) FROM fills WHERE trade_id=trades.id AND side='exit'),
+        exit_avg = IFNULL(
+            (SELECT SUM(price * qty) / NULLIF(SUM(qty), 0) FROM fills WHERE trade_id=trades.id AND side='exit'),
+            (SELECT price FROM fills WHERE trade_id=trades.id AND side='exit' ORDER BY id DESC LIMIT 1)
+        ),
+        avg_down_count = MAX((SELECT COUNT(*) FROM fills WHERE trade_id=trades.id AND side='entry') - 1, 0),
+        trim_count = MAX((SELECT COUNT(*) FROM fills WHERE trade_id=trades.id AND side='exit') - (opened=0), 0)
+    '''
+    params = []
+    if trade_ids is not None:
+        query += f" WHERE id IN ({','.join('?' * len(trade_ids))})"
+        params = list(trade_ids)
+    cursor.execute(query, params)
+
+def _migrate_legacy_fill_columns(cursor, columns):
+    """Move avg_downN / trimN slots of an old trades table into fills, then drop them."""
+    for column, definition in (('entry_avg', 'REAL'), ('entry_qty', 'INTEGER NOT NULL DEFAULT 0'),
+                               ('exit_avg', 'REAL'), ('exit_qty', 'INTEGER NOT NULL DEFAULT 0'),
+                               ('avg_down_count', 'INTEGER NOT NULL DEFAULT 0'),
+                               ('trim_count', 'INTEGER NOT NULL DEFAULT 0')):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE trades ADD COLUMN {column} {definition}')
+
+    # Entries: the opening fill, then the avg-downs
+    cursor.execute('''
+    INSERT INTO fills (trade_id, side, price, qty, timestamp)
+    SELECT id, 'entry', price, qty, timestamp FROM trades
+    ''')
+    for n in (1, 2):
+        cursor.execute(f'''
+        INSERT INTO fills (trade_id, side, price, qty, timestamp)
+        SELECT id, 'entry', avg_down{n}, IFNULL(avg_down{n}_qty, 0), timestamp
+        FROM trades WHERE avg_down{n} IS NOT NULL
+        ''')
+    # Exits: trims never had a size, then the close for the whole position
+    for n in (1, 2, 3, 4):
+        cursor.execute(f'''
+        INSERT INTO fills (trade_id, side, price, qty, timestamp)
+        SELECT id, 'exit', trim{n}, 0, IFNULL(closed_timestamp, timestamp)
+        FROM trades WHERE trim{n} IS NOT NULL
+        ''')
+    cursor.execute('''
+    INSERT INTO fills (trade_id, side, price, qty, timestamp)
+    SELECT id, 'exit', closing_price, qty + IFNULL(avg_down1_qty, 0) + IFNULL(avg_down2_qty, 0),
+           IFNULL(closed_timestamp, timestamp)
+    FROM trades WHERE opened=0 AND closing_price IS NOT NULL
+    ''')
+
+    rebuild_trade_averages(cursor)
+    for column in LEGACY_FILL_COLUMNS:
+        cursor.execute(f'ALTER TABLE trades DROP COLUMN {column}')
+
+def backfill_expirations(cursor):
+    """Fill the ISO expiration of rows that only have the M/D/YY date text."""
+    cursor.execute('SELECT id, date FROM trades WHERE expiration IS NULL AND date IS NOT NULL')
+    updates = []
+    for trade_id, date_str in cursor.fetchall():
+        expiration = to_iso_expiration(date_str)
+        if expiration is None:
+            print(f"Error parsing date '{date_str}' for trade {trade_id}, expiration left empty")
+            continue
+        updates.append((expiration, trade_id))
+    cursor.executemany('UPDATE trades SET expiration=? WHERE id=?', updates)
+
+def _table_columns(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {row[1] for row in cursor.fetchall()}
+
+# Every migration is idempotent, so databases created before schema_version existed
+# (by the old initialize_db on import) can replay the whole list safely.
+def _migration_create_trades(cursor):
+    """Original trades table, with the avg-down slots added to databases that predate them."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS trades (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user TEXT NOT NULL,
+        ticker TEXT NOT NULL,
+        date TEXT,
+        strike TEXT,
+        type TEXT,
+        price REAL NOT NULL,
+        qty INTEGER NOT NULL DEFAULT 1,
+        avg_down1 REAL,
+        avg_down1_qty INTEGER,
+        avg_down2 REAL,
+        avg_down2_qty INTEGER,
+        trim1 REAL,
+        trim2 REAL,
+        trim3 REAL,
+        trim4 REAL,
+        closing_price REAL,
+        opened INTEGER NOT NULL,
+        timestamp TEXT NOT NULL,
+        closed_timestamp TEXT
+    )
+    ''')
+    columns = _table_columns(cursor, 'trades')
+    if 'trim1' in columns:
+        for column, sql_type in (('avg_down1', 'REAL'), ('avg_down1_qty', 'INTEGER'),
+                                 ('avg_down2', 'REAL'), ('avg_down2_qty', 'INTEGER')):
+            if column not in columns:
+                cursor.execute(f'ALTER TABLE trades ADD COLUMN {column} {sql_type}')
+
+def _migration_fills(cursor):
+    """Append-only executions of a trade: 'entry' (open, avg-down) or 'exit' (trim, close)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS fills (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        trade_id INTEGER NOT NULL REFERENCES trades(id),
+        side TEXT NOT NULL,
+        price REAL NOT NULL,
+        qty INTEGER NOT NULL,
+        timestamp TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fills_trade_id ON fills(trade_id)')
+    columns = _table_columns(cursor, 'trades')
+    if 'trim1' in columns:
+        _migrate_legacy_fill_columns(cursor, columns)
+
+def _migration_expiration(cursor):
+    if 'expiration' not in _table_columns(cursor, 'trades'):
+        cursor.execute('ALTER TABLE trades ADD COLUMN expiration TEXT')
+    backfill_expirations(cursor)
+
+def _migration_aggregates(cursor):
+    """Stored PnL of closed trades and the per-user aggregates kept up to date by the writes."""
+    if 'pnl' not in _table_columns(cursor, 'trades'):
+        cursor.execute('ALTER TABLE trades ADD COLUMN pnl REAL')
+    # One row per user and instrument class (options/stocks/futures/other). PnL is in %
+    # (points for futures) like TradeStats; hold times in seconds.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS trade_aggregates (
+        user TEXT NOT NULL,
+        instrument TEXT NOT NULL,
+        opened_count INTEGER NOT NULL DEFAULT 0,
+        closed_count INTEGER NOT NULL DEFAULT 0,
+        avg_downs INTEGER NOT NULL DEFAULT 0,
+        trims INTEGER NOT NULL DEFAULT 0,
+        pnl_count INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        losses INTEGER NOT NULL DEFAULT 0,
+        pnl_sum REAL NOT NULL DEFAULT 0,
+        pnl_sq_sum REAL NOT NULL DEFAULT 0,
+        pnl_min REAL,
+        pnl_max REAL,
+        hold_count INTEGER NOT NULL DEFAULT 0,
+        hold_sum REAL NOT NULL DEFAULT 0,
+        hold_min REAL,
+        hold_max REAL,
+        PRIMARY KEY (user, instrument)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ticker_counts (
+        user TEXT NOT NULL,
+        ticker TEXT NOT NULL,
+        trades INTEGER NOT NULL DEFAULT 0,
+        first_id INTEGER NOT NULL,
+        PRIMARY KEY (user, ticker)
+    )
+    ''')
+    sync_indexes(cursor, INDEXES_V5)
+    _rebuild_aggregates(cursor)
+
+def _migration_leaderboard(cursor):
+    """Materialized per-user totals of the bounded timeframes, read by get_leaderboard."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS leaderboard (
+        timeframe TEXT NOT NULL,
+        user TEXT NOT NULL,
+        instrument TEXT NOT NULL,
+        opened_count INTEGER NOT NULL DEFAULT 0,
+        closed_count INTEGER NOT NULL DEFAULT 0,
+        pnl_count INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        losses INTEGER NOT NULL DEFAULT 0,
+        pnl_sum REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (timeframe, user, instrument)
+    )
+    ''')
+    _refresh_leaderboard(cursor)
+
+def merge_duplicate_open_positions(cursor):
+    """Fold open trades rows that repeat a position into the oldest one, so it can be UNIQUE.
+
+    Before idx_trades_open_position two racing opens could both insert. The fills of the
+    newer rows move to the oldest, which then holds the summed entry quantity at the
+    weighted entry price (the extra opens count as avg-downs), and the newer rows are deleted.
+    """
+    cursor.execute('''
+    SELECT MIN(id), GROUP_CONCAT(id) FROM trades WHERE opened=1
+    GROUP BY user, ticker, IFNULL(date, ''), IFNULL(strike, ''), IFNULL(type, '')
+    HAVING COUNT(*) > 1
+    ''')
+    kept_ids = []
+    for kept_id, ids in cursor.fetchall():
+        extra_ids = [int(i) for i in ids.split(',') if int(i) != kept_id]
+        marks = ','.join('?' * len(extra_ids))
+        cursor.execute(f'UPDATE fills SET trade_id=? WHERE trade_id IN ({marks})', [kept_id] + extra_ids)
+        cursor.execute(f'DELETE FROM trades WHERE id IN ({marks})', extra_ids)
+        kept_ids.append(kept_id)
+        print(f"Merged duplicated open trades {extra_ids} into trade {kept_id}")
+    if kept_ids:
+        rebuild_trade_averages(cursor, kept_ids)
+
+def _migration_indexes_v4(cursor):
+    merge_duplicate_open_positions(cursor)
+    sync_indexes(cursor, INDEXES_V4)
+
+def _migration_indexes_v7(cursor):
+    sync_indexes(cursor, INDEXES_V7)
+
+# Ordered schema history. Append new entries; never edit or renumber applied ones.
+MIGRATIONS = [
+    (1, "create trades table", _migration_create_trades),
+    (2, "fills table replacing trim/avg_down slots", _migration_fills),
+    (3, "ISO expiration column", _migration_expiration),
+    (4, "managed trade indexes", _migration_indexes_v4),
+    (5, "trade aggregates", _migration_aggregates),
+    (6, "leaderboard", _migration_leaderboard),
+    (7, "equity curve index", _migration_indexes_v7),
+]
+
+def get_schema_version(cursor):
+    """Return the highest applied migration version (0 for a new database)."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_version'")
+    if cursor.fetchone() is None:
+        return 0
+    cursor.execute('SELECT IFNULL(MAX(version), 0) FROM schema_version')
+    return cursor.fetchone()[0]
+
+def migrate():
+    """Apply pending MIGRATIONS in a single transaction and return the versions applied."""
+    with get_db_connection() as conn:
+        if get_schema_version(conn.cursor()) >= MIGRATIONS[-1][0]:
+            return []  # Up to date: no write lock taken
+
+    applied = []
+    with write_transaction() as cursor:
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS trades (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user TEXT NOT NULL,
-            ticker TEXT NOT NULL,
-            date TEXT,
-            strike TEXT,
-            type TEXT,
-            price REAL NOT NULL,
-            qty INTEGER NOT NULL DEFAULT 1,
-            avg_down1 REAL,
-            avg_down1_qty INTEGER,
-            avg_down2 REAL,
-            avg_down2_qty INTEGER,
-            trim1 REAL,
-            trim2 REAL,
-            trim3 REAL,
-            trim4 REAL,
-            closing_price REAL,
-            opened INTEGER NOT NULL,
-            timestamp TEXT NOT NULL,
-            closed_timestamp TEXT
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
         )
         ''')
-        # Add new columns if they don't exist (for migration)
-        try:
-            cursor.execute('ALTER TABLE trades ADD COLUMN avg_down1 REAL')
-        except sqlite3.OperationalError:
-            pass
-        try:
-            cursor.execute('ALTER TABLE trades ADD COLUMN avg_down1_qty INTEGER')
-        except sqlite3.OperationalError:
-            pass
-        try:
-            cursor.execute('ALTER TABLE trades ADD COLUMN avg_down2 REAL')
-        except sqlite3.OperationalError:
-            pass
-        try:
-            cursor.execute('ALTER TABLE trades ADD COLUMN avg_down2_qty INTEGER')
-        except sqlite3.OperationalError:
-            pass
+        # Re-read under the write lock in case another process migrated meanwhile
+        current = get_schema_version(cursor)
+        for version, name, apply in MIGRATIONS:
+            if version <= current:
+                continue
+            apply(cursor)
+            cursor.execute(
+                'INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+                (version, name, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            applied.append(version)
+    return applied
+
+def initialize_db():
+    """Bring the database schema up to date. Call once at startup, importing this module never touches disk."""
+    applied = migrate()
+    if applied:
+        print(f"Applied database migrations: {applied}")
+
+# Windows of get_trade_stats and the leaderboard, over the opening timestamp
+TIMEFRAMES = ("today", "weekly", "monthly", "yearly", "all")
+
+def timeframe_start(timeframe, now=None):
+    """Lower bound of the opening timestamp for `timeframe`, or None if the timeframe is invalid."""
+    now = now or datetime.now()
+    if timeframe == "today":
+        start = datetime.combine(now, time.min)
+    elif timeframe == "weekly":
+        start = now - timedelta(days=7)
+    elif timeframe == "monthly":
+        start = now - timedelta(days=30)
+    elif timeframe == "yearly":
+        start = now - timedelta(days=365)
+    elif timeframe == "all":
+        return '1970-01-01 00:00:00'  # Beginning of time for "all"
+    else:
+        return None
+    return start.strftime('%Y-%m-%d %H:%M:%S')
+
+def _open_position_filter(user, ticker, date=None, strike=None, type_opt=None):
+    """Build the WHERE clause and params that select the open position of a user."""
+    clause = "user=? AND ticker=? AND opened=1"
+    params = [user, ticker]
+
+    if date:
+        clause += " AND date=?"
+        params.append(date)
+    if strike:
+        clause += " AND strike=?"
+        params.append(strike)
+    if type_opt:
+        clause += " AND type=?"
+        params.append(type_opt)
+
+    return clause, params
+
+@contextmanager
+def write_transaction():
+    """Run the block in an immediate (write-locked) transaction on the pooled connection."""
+    conn = get_db_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
         conn.commit()
 
-# Initialize the database when the module is loaded
-initialize_db()
+def _position_exists(cursor, user, ticker, date=None, strike=None, type_opt=None):
+    where, params = _open_position_filter(user, ticker, date, strike, type_opt)
+    cursor.execute(f'SELECT 1 FROM trades WHERE {where} LIMIT 1', params)
+    return cursor.fetchone() is not None
+
+def _add_fill(cursor, trade_id, side, price, qty, timestamp):
+    cursor.execute('''
+    INSERT INTO fills (trade_id, side, price, qty, timestamp) VALUES (?, ?, ?, ?, ?)
+    ''', (trade_id, side, price, qty, timestamp))
+
+# Instrument class of a trades row, grouped like TradeStats
+INSTRUMENT_CLASS_SQL = """CASE WHEN instr(ticker, '/') > 0 THEN 'futures'
+         WHEN type IN ('C', 'P') THEN 'options'
+         WHEN type IN ('S', 'L') THEN 'stocks'
+         ELSE 'other' END"""
+# Seconds a closed trades row was held (NULL if a timestamp does not parse)
+HOLD_SECONDS_SQL = "CAST(strftime('%s', closed_timestamp) AS INTEGER) - CAST(strftime('%s', timestamp) AS INTEGER)"
+
+AGGREGATE_COUNTERS = (
+    'opened_count', 'closed_count', 'avg_downs', 'trims', 'pnl_count', 'wins', 'losses',
+    'pnl_sum', 'pnl_sq_sum', 'hold_count', 'hold_sum',
+)
+
+def _store_pnl(cursor, where, params):
+    """Compute and store the PnL of the closed trades matched by `where`. Returns how many."""
+    cursor.execute(f'''
+    SELECT id, ticker, type, price, qty, entry_avg, entry_qty, exit_avg, closing_price
+    FROM trades WHERE opened=0 AND {where}
+    ''', params)
+    updates = [(trade_pnl(dict(row))[0], row["id"]) for row in cursor.fetchall()]
+    cursor.executemany('UPDATE trades SET pnl=? WHERE id=?', updates)
+    return len(updates)
+
+def _bump_aggregates(cursor, trade_id, opened=0, closed=0, avg_downs=0, trims=0):
+    """Fold one write on a trade into its user's trade_aggregates row.
+
+    With `closed`, the stored PnL and the hold time of the (now closed) trade are added too.
+    """
+    cursor.execute(f'''
+    INSERT INTO trade_aggregates (user, instrument, opened_count, closed_count, avg_downs, trims,
+                                  pnl_count, wins, losses, pnl_sum, pnl_sq_sum, pnl_min, pnl_max,
+                                  hold_count, hold_sum, hold_min, hold_max)
+    SELECT user, instrument, ?, ?, ?, ?,
+           pnl IS NOT NULL, IFNULL(pnl > 0, 0), IFNULL(pnl < 0, 0), IFNULL(pnl, 0), IFNULL(pnl * pnl, 0), pnl, pnl,
+           hold IS NOT NULL, IFNULL(hold, 0), hold, hold
+    FROM (SELECT user, {INSTRUMENT_CLASS_SQL} AS instrument,
+                 CASE WHEN ? THEN pnl END AS pnl,
+                 CASE WHEN ? THEN {HOLD_SECONDS_SQL} END AS hold
+          FROM trades WHERE id=?)
+    WHERE true
+    ON CONFLICT(user, instrument) DO UPDATE SET
+        {', '.join(f'{c} = {c} + excluded.{c}' for c in AGGREGATE_COUNTERS)},
+        pnl_min = MIN(IFNULL(pnl_min, excluded.pnl_min), IFNULL(excluded.pnl_min, pnl_min)),
+        pnl_max = MAX(IFNULL(pnl_max, excluded.pnl_max), IFNULL(excluded.pnl_max, pnl_max)),
+        hold_min = MIN(IFNULL(hold_min, excluded.hold_min), IFNULL(excluded.hold_min, hold_min)),
+        hold_max = MAX(IFNULL(hold_max, excluded.hold_max), IFNULL(excluded.hold_max, hold_max))
+    ''', (opened, closed, avg_downs, trims, closed, closed, trade_id))
+
+def _rebuild_aggregates(cursor, user=None):
+    """Recompute trades.pnl, trade_aggregates and ticker_counts from the raw trades.
+
+    The reference computation for what the writes maintain incrementally, for one user or
+    everyone. Returns the number of closed trades whose PnL was recomputed.
+    """
+    where, params = ("user=?", [user]) if user is not None else ("1", [])
+    recomputed = _store_pnl(cursor, where, params)
+
+    cursor.execute(f'DELETE FROM trade_aggregates WHERE {where}', params)
+    cursor.execute(f'''
+    INSERT INTO trade_aggregates (user, instrument, opened_count, closed_count, avg_downs, trims,
+                                  pnl_count, wins, losses, pnl_sum, pnl_sq_sum, pnl_min, pnl_max,
+                                  hold_count, hold_sum, hold_min, hold_max)
+    SELECT user, instrument, COUNT(*), SUM(opened=0), SUM(avg_down_count), SUM(trim_count),
+           COUNT(pnl), IFNULL(SUM(pnl > 0), 0), IFNULL(SUM(pnl < 0), 0), TOTAL(pnl), TOTAL(pnl * pnl), MIN(pnl), MAX(pnl),
+           COUNT(hold), TOTAL(hold), MIN(hold), MAX(hold)
+    FROM (SELECT user, {INSTRUMENT_CLASS_SQL} AS instrument, opened, avg_down_count, trim_count,
+                 CASE WHEN opened=0 THEN pnl END AS pnl,
+                 CASE WHEN opened=0 THEN {HOLD_SECONDS_SQL} END AS hold
+          FROM trades WHERE {where})
+    GROUP BY user, instrument
+    ''', params)
+
+    cursor.execute(f'DELETE FROM ticker_counts WHERE {where}', params)
+    cursor.execute(f'''
+    INSERT INTO ticker_counts (user, ticker, trades, first_id)
+    SELECT user, ticker, COUNT(*), MIN(id) FROM trades WHERE {where} GROUP BY user, ticker
+    ''', params)
+    return recomputed
+
+def rebuild_aggregates(user=None):
+    """Recompute the stored PnL and per-user aggregates from the raw trades (one user or all)."""
+    try:
+        with write_transaction() as cursor:
+            recomputed = _rebuild_aggregates(cursor, user)
+            _refresh_leaderboard(cursor)
+            return recomputed
+    except sqlite3.Error as e:
+        print(f"Database error in rebuild_aggregates: {e}")
+        return None
+
+# Timeframes materialized in the leaderboard table ("all" is read from trade_aggregates).
+# Writes add to every window the trade falls in; trades only leave a window when
+# refresh_leaderboard() recomputes it, so run that on a schedule.
+LEADERBOARD_TIMEFRAMES = ("today", "weekly", "monthly", "yearly")
+
+def _bump_leaderboard(cursor, trade_id, opened=0, closed=0):
+    """Add an opened or closed trade to the leaderboard windows that contain its opening time."""
+    now = datetime.now()
+    windows = [value for timeframe in LEADERBOARD_TIMEFRAMES for value in (timeframe, timeframe_start(timeframe, now))]
+    cursor.execute(f'''
+    INSERT INTO leaderboard (timeframe, user, instrument, opened_count, closed_count,
+                             pnl_count, wins, losses, pnl_sum)
+    SELECT w.column1, user, instrument, ?, ?,
+           pnl IS NOT NULL, IFNULL(pnl > 0, 0), IFNULL(pnl < 0, 0), IFNULL(pnl, 0)
+    FROM (SELECT user, timestamp, {INSTRUMENT_CLASS_SQL} AS instrument,
+                 CASE WHEN ? THEN pnl END AS pnl
+          FROM trades WHERE id=?)
+    JOIN (VALUES {', '.join(['(?, ?)'] * len(LEADERBOARD_TIMEFRAMES))}) AS w ON timestamp >= w.column2
+    WHERE true
+    ON CONFLICT(timeframe, user, instrument) DO UPDATE SET
+        {', '.join(f'{c} = {c} + excluded.{c}' for c in ('opened_count', 'closed_count', 'pnl_count', 'wins', 'losses', 'pnl_sum'))}
+    ''', [opened, closed, closed, trade_id] + windows)
+
+def _refresh_leaderboard(cursor):
+    """Recompute every leaderboard window from the trades (and their stored PnL). Returns the row count."""
+    now = datetime.now()
+    cursor.execute('DELETE FROM leaderboard')
+    for timeframe in LEADERBOARD_TIMEFRAMES:
+        cursor.execute(f'''
+        INSERT INTO leaderboard (timeframe, user, instrument, opened_count, closed_count,
+                                 pnl_count, wins, losses, pnl_sum)
+        SELECT ?, user, instrument, COUNT(*), SUM(opened=0),
+               COUNT(pnl), IFNULL(SUM(pnl > 0), 0), IFNULL(SUM(pnl < 0), 0), TOTAL(pnl)
+        FROM (SELECT user, opened, {INSTRUMENT_CLASS_SQL} AS instrument,
+                     CASE WHEN opened=0 THEN pnl END AS pnl
+              FROM trades WHERE timestamp >= ?)
+        GROUP BY user, instrument
+        ''', (timeframe, timeframe_start(timeframe, now)))
+    cursor.execute('SELECT COUNT(*) FROM leaderboard')
+    return cursor.fetchone()[0]
+
+def refresh_leaderboard():
+    """Recompute the materialized leaderboard windows, dropping trades that slid out of them."""
+    try:
+        with write_transaction() as cursor:
+            return _refresh_leaderboard(cursor)
+    except sqlite3.Error as e:
+        print(f"Database error in refresh_leaderboard: {e}")
+        return None
 
 def is_trade_open(user, ticker, date=None, strike=None, type_opt=None):
     """Check if a trade is open for the given user and ticker."""
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            query = '''
-            SELECT id FROM trades WHERE user=? AND ticker=? AND opened=1
-            '''
-            params = [user, ticker]
-
-            if date:
-                query += " AND date=?"
-                params.append(date)
-            if strike:
-                query += " AND strike=?"
-                params.append(strike)
-            if type_opt:
-                query += " AND type=?"
-                params.append(type_opt)
-
-            cursor.execute(query, params)
-            result = cursor.fetchone()
-            return result is not None
+            return _position_exists(conn.cursor(), user, ticker, date, strike, type_opt)
     except sqlite3.Error as e:
         print(f"Database error in is_trade_open: {e}")
         return False
@@ -87,225 +673,167 @@ def is_trade_open(user, ticker, date=None, strike=None, type_opt=None):
 def open_trade(user, ticker, price, qty=1, date=None, strike=None, type_opt=None):
     """Open a new trade and return the opening price and None for closing price."""
     try:
-        if is_trade_open(user, ticker, date, strike, type_opt):
-            return None  # Trade already open
-
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
+        where, params = _open_position_filter(user, ticker, date, strike, type_opt)
+        with write_transaction() as cursor:
+            # The NOT EXISTS guard and the unique open-position index make the
+            # check-and-insert a single atomic statement.
+            cursor.execute(f'''
+            INSERT INTO trades (user, ticker, date, expiration, strike, type, price, qty, entry_avg, entry_qty, opened, timestamp)
+            SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?
+            WHERE NOT EXISTS (SELECT 1 FROM trades WHERE {where})
+            ON CONFLICT DO NOTHING
+            RETURNING id
+            ''', [user, ticker, date, to_iso_expiration(date), strike, type_opt, price, qty, price, qty, now] + params)
+            result = cursor.fetchone()
+            if result is None:
+                return None  # Trade already open
+            _add_fill(cursor, result[0], 'entry', price, qty, now)
+            _bump_aggregates(cursor, result[0], opened=1)
+            _bump_leaderboard(cursor, result[0], opened=1)
             cursor.execute('''
-            INSERT INTO trades (user, ticker, date, strike, type, price, qty, opened, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)
-            ''', (user, ticker, date, strike, type_opt, price, qty, now))
-            conn.commit()
+            INSERT INTO ticker_counts (user, ticker, trades, first_id) VALUES (?, ?, 1, ?)
+            ON CONFLICT(user, ticker) DO UPDATE SET trades = trades + 1
+            ''', (user, ticker, result[0]))
         return (price, None)
     except sqlite3.Error as e:
         print(f"Database error in open_trade: {e}")
         return None
 
 def avg_down_trade(user, ticker, avg_price, avg_qty, date=None, strike=None, type_opt=None):
-    """Add an average-down price and quantity to the next available avg_down column."""
+    """Add an average-down fill and return the new average entry price and avg-down count."""
     try:
-        if not is_trade_open(user, ticker, date, strike, type_opt):
-            return None  # No open trade found
-
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            query_select = '''
-            SELECT id, price, qty, avg_down1, avg_down1_qty, avg_down2, avg_down2_qty
-            FROM trades
-            WHERE user=? AND ticker=? AND opened=1
-            '''
-            params_select = [user, ticker]
-
-            if date:
-                query_select += " AND date=?"
-                params_select.append(date)
-            if strike:
-                query_select += " AND strike=?"
-                params_select.append(strike)
-            if type_opt:
-                query_select += " AND type=?"
-                params_select.append(type_opt)
-
-            cursor.execute(query_select, params_select)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        where, params = _open_position_filter(user, ticker, date, strike, type_opt)
+        with write_transaction() as cursor:
+            # SET expressions see the pre-update row, RETURNING sees the updated one
+            cursor.execute(f'''
+            UPDATE trades SET
+                entry_avg = CASE WHEN entry_qty + ? > 0
+                                 THEN (IFNULL(entry_avg, 0) * entry_qty + ? * ?) / (entry_qty + ?)
+                                 ELSE entry_avg END,
+                entry_qty = entry_qty + ?,
+                avg_down_count = avg_down_count + 1
+            WHERE id = (SELECT id FROM trades WHERE {where} LIMIT 1)
+            RETURNING id, CAST(entry_avg AS REAL), avg_down_count
+            ''', [avg_qty, avg_price, avg_qty, avg_qty, avg_qty] + params)
             result = cursor.fetchone()
-
             if not result:
                 return None  # No open trade found
 
-            trade_id, orig_price, orig_qty, avg_down1, avg_down1_qty, avg_down2, avg_down2_qty = result
-            avg_count = sum(1 for avg in [avg_down1, avg_down2] if avg is not None)
-
-            if avg_count >= 2:
-                return False  # Maximum avg-downs reached
-
-            # Determine the next avg_down column
-            avg_column = f"avg_down{avg_count + 1}"
-            avg_qty_column = f"avg_down{avg_count + 1}_qty"
-            query_update = f'''
-            UPDATE trades SET {avg_column}=?, {avg_qty_column}=? WHERE id=?
-            '''
-            cursor.execute(query_update, (avg_price, avg_qty, trade_id))
-            conn.commit()
-
-            # Calculate new average entry price
-            prices = [(orig_price, orig_qty)]
-            if avg_down1 is not None:
-                prices.append((avg_down1, avg_down1_qty))
-            if avg_down2 is not None:
-                prices.append((avg_down2, avg_down2_qty))
-            prices.append((avg_price, avg_qty))
-
-            total_qty = sum(q for _, q in prices)
-            avg_entry_price = sum(p * q for p, q in prices) / total_qty if total_qty > 0 else orig_price
-
-            return (avg_entry_price, avg_count + 1)
+            trade_id, avg_entry_price, avg_count = result
+            _add_fill(cursor, trade_id, 'entry', avg_price, avg_qty, now)
+            _bump_aggregates(cursor, trade_id, avg_downs=1)
+        return (avg_entry_price, avg_count)
     except sqlite3.Error as e:
         print(f"Database error in avg_down_trade: {e}")
         return None
 
-def trim_trade(user, ticker, trim_price, date=None, strike=None, type_opt=None):
-    """Add a trim price to the next available trim column and return the opening price and trim count."""
-    try:
-        if not is_trade_open(user, ticker, date, strike, type_opt):
-            return None  # No open trade found
-
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            query_select = '''
-            SELECT id, price, trim1, trim2, trim3, trim4 FROM trades
-            WHERE user=? AND ticker=? AND opened=1
-            '''
-            params_select = [user, ticker]
-
-            if date:
-                query_select += " AND date=?"
-                params_select.append(date)
-            if strike:
-                query_select += " AND strike=?"
-                params_select.append(strike)
-            if type_opt:
-                query_select += " AND type=?"
-                params_select.append(type_opt)
-
-            cursor.execute(query_select, params_select)
-            result = cursor.fetchone()
+def _apply_exit(cursor, where, params, exit_price, exit_qty_sql, exit_qty_params, now, extra_set="", extra_params=()):
+    """Record an exit fill on the open position matched by `where` and fold it into exit_avg.
 
-            if not result:
-                return None  # No open trade found
+    `exit_qty_sql` is evaluated against the position row, so the close can size its fill
+    as whatever is left open. Returns (trade_id, entry_avg, trim_count) or None.
+    """
+    cursor.execute(f'''
+    INSERT INTO fills (trade_id, side, price, qty, timestamp)
+    SELECT id, 'exit', ?, {exit_qty_sql}, ? FROM trades WHERE {where} LIMIT 1
+    RETURNING trade_id, qty
+    ''', [exit_price] + exit_qty_params + [now] + params)
+    fill = cursor.fetchone()
+    if not fill:
+        return None
 
-            trade_id, opening_price, trim1, trim2, trim3, trim4 = result
-            trim_count = sum(1 for trim in [trim1, trim2, trim3, trim4] if trim is not None)
+    trade_id, qty = fill
+    cursor.execute(f'''
+    UPDATE trades SET
+        exit_avg = CASE WHEN exit_qty + ? > 0
+                        THEN (IFNULL(exit_avg, 0) * exit_qty + ? * ?) / (exit_qty + ?)
+                        ELSE ? END,
+        exit_qty = exit_qty + ?{extra_set}
+    WHERE id=?
+    RETURNING id, CAST(entry_avg AS REAL), trim_count
+    ''', [qty, exit_price, qty, qty, exit_price, qty, *extra_params, trade_id])
+    return cursor.fetchone()
 
-            if trim_count >= 4:
-                return False  # Maximum trims reached
+def trim_trade(user, ticker, trim_price, date=None, strike=None, type_opt=None, trim_qty=0):
+    """Add a trim fill and return the average entry price and trim count.
 
-            # Determine the next trim column
-            trim_column = f"trim{trim_count + 1}"
-            query_update = f'''
-            UPDATE trades SET {trim_column}=? WHERE id=?
-            '''
-            cursor.execute(query_update, (trim_price, trade_id))
-            conn.commit()
+    Trims sent from Discord carry no size, so by default they are recorded with qty 0:
+    they are counted but do not move the weighted exit average.
+    """
+    try:
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        where, params = _open_position_filter(user, ticker, date, strike, type_opt)
+        with write_transaction() as cursor:
+            result = _apply_exit(cursor, where, params, trim_price, "?", [trim_qty], now,
+                                 extra_set=", trim_count = trim_count + 1")
+            if result:
+                _bump_aggregates(cursor, result[0], trims=1)
+        if not result:
+            return None  # No open trade found
 
-            return (opening_price, trim_count + 1)
+        _, avg_entry_price, trim_count = result
+        return (avg_entry_price, trim_count)
     except sqlite3.Error as e:
         print(f"Database error in trim_trade: {e}")
         return None
 
-def close_trade(user, ticker, closing_price, date=None, strike=None, type_opt=None):
-    """Close an existing trade and return the opening and closing prices."""
-    try:
-        if not is_trade_open(user, ticker, date, strike, type_opt):
-            return None  # No open trade found
+def _close_position(cursor, now, user, ticker, closing_price, date=None, strike=None, type_opt=None):
+    where, params = _open_position_filter(user, ticker, date, strike, type_opt)
+    # The closing fill covers whatever quantity is still open
+    result = _apply_exit(cursor, where, params, closing_price, "MAX(entry_qty - exit_qty, 0)", [], now,
+                         extra_set=", opened=0, closed_timestamp=?, closing_price=?",
+                         extra_params=(now, closing_price))
+    if not result:
+        return None  # No open trade found
 
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            query_select = '''
-            SELECT id, price, qty, avg_down1, avg_down1_qty, avg_down2, avg_down2_qty
-            FROM trades WHERE user=? AND ticker=? AND opened=1
-            '''
-            params_select = [user, ticker]
-
-            if date:
-                query_select += " AND date=?"
-                params_select.append(date)
-            if strike:
-                query_select += " AND strike=?"
-                params_select.append(strike)
-            if type_opt:
-                query_select += " AND type=?"
-                params_select.append(type_opt)
-
-            cursor.execute(query_select, params_select)
-            result = cursor.fetchone()
-
-            if not result:
-                return None  # No open trade found
-
-            trade_id, orig_price, orig_qty, avg_down1, avg_down1_qty, avg_down2, avg_down2_qty = result
+    trade_id, avg_entry_price, _ = result
+    _store_pnl(cursor, "id=?", [trade_id])
+    _bump_aggregates(cursor, trade_id, closed=1)
+    _bump_leaderboard(cursor, trade_id, closed=1)
+    return (avg_entry_price, closing_price)
 
-            # Calculate average entry price
-            prices = [(orig_price, orig_qty)]
-            if avg_down1 is not None:
-                prices.append((avg_down1, avg_down1_qty))
-            if avg_down2 is not None:
-                prices.append((avg_down2, avg_down2_qty))
-
-            total_qty = sum(q for _, q in prices)
-            avg_entry_price = sum(p * q for p, q in prices) / total_qty if total_qty > 0 else orig_price
-
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            query = '''
-            UPDATE trades SET opened=0, closed_timestamp=?, closing_price=?
-            WHERE user=? AND ticker=? AND opened=1
-            '''
-            params = [now, closing_price, user, ticker]
-
-            if date:
-                query += " AND date=?"
-                params.append(date)
-            if strike:
-                query += " AND strike=?"
-                params.append(strike)
-            if type_opt:
-                query += " AND type=?"
-                params.append(type_opt)
+def close_trade(user, ticker, closing_price, date=None, strike=None, type_opt=None):
+    """Close an existing trade and return the average entry and closing prices."""
+    try:
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with write_transaction() as cursor:
+            return _close_position(cursor, now, user, ticker, closing_price, date, strike, type_opt)
+    except sqlite3.Error as e:
+        print(f"Database error in close_trade: {e}")
+        return None
 
-            cursor.execute(query, params)
-            conn.commit()
+def close_trades(closures):
+    """Close many trades in one transaction.
 
-            return (avg_entry_price, closing_price)
+    `closures` is a list of (user, ticker, closing_price, date, strike, type_opt) tuples.
+    Returns one close_trade-style result per closure, or None if the transaction failed.
+    """
+    try:
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with write_transaction() as cursor:
+            return [_close_position(cursor, now, *closure) for closure in closures]
     except sqlite3.Error as e:
-        print(f"Database error in close_trade: {e}")
+        print(f"Database error in close_trades: {e}")
         return None
 
-def get_trade_stats(user, timeframe, status):
-    """Fetch trade statistics for a user within a timeframe and status."""
+STATS_COLUMNS = '''id, ticker, date, strike, type, price, qty, entry_avg, entry_qty,
+                   exit_avg, exit_qty, avg_down_count, trim_count,
+                   closing_price, opened, timestamp, closed_timestamp'''
+
+def get_trade_stats(user, timeframe, status, limit=None):
+    """Fetch trade statistics for a user within a timeframe and status (the first `limit` rows if given)."""
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            now = datetime.now()
-
-            # Define timeframe filter
-            if timeframe == "today":
-                start_date = datetime.combine(datetime.now(), time.min).strftime('%Y-%m-%d %H:%M:%S')
-            elif timeframe == "weekly":
-                start_date = (now - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
-            elif timeframe == "monthly":
-                start_date = (now - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
-            elif timeframe == "yearly":
-                start_date = (now - timedelta(days=365)).strftime('%Y-%m-%d %H:%M:%S')
-            elif timeframe == "all":
-                start_date = '1970-01-01 00:00:00'  # Beginning of time for "all"
-            else:
+
+            start_date = timeframe_start(timeframe)
+            if start_date is None:
                 return None  # Invalid timeframe
 
-            query = '''
-            SELECT ticker, date, strike, type, price, qty, avg_down1, avg_down1_qty,
-                   avg_down2, avg_down2_qty, trim1, trim2, trim3, trim4,
-                   closing_price, opened, timestamp, closed_timestamp
+            query = f'''
+            SELECT {STATS_COLUMNS}
             FROM trades WHERE user=? AND timestamp >= ?
             '''
             params = [user, start_date]
@@ -317,6 +845,10 @@ def get_trade_stats(user, timeframe, status):
             elif status != "all":
                 return None  # Invalid status
 
+            if limit is not None:
+                query += " LIMIT ?"
+                params.append(limit)
+
             cursor.execute(query, params)
             trades = cursor.fetchall()
             return trades
@@ -324,6 +856,220 @@ def get_trade_stats(user, timeframe, status):
         print(f"Database error in get_trade_stats: {e}")
         return None
 
+def get_user_aggregates(user, limit=3):
+    """All-time statistics of a user from trade_aggregates, without reading their history.
+
+    Returns {"classes": {instrument: aggregate row}, "tickers": {ticker: trades} in
+    first-traded order, "best"/"worst": the `limit` closed trades by stored PnL},
+    or None if the user has no trades.
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM trade_aggregates WHERE user=?', (user,))
+            classes = {row["instrument"]: dict(row) for row in cursor.fetchall()}
+            if not classes:
+                return None
+
+            cursor.execute('SELECT ticker, trades FROM ticker_counts WHERE user=? ORDER BY first_id', (user,))
+            tickers = {row["ticker"]: row["trades"] for row in cursor.fetchall()}
+
+            # Ties in the same order as TradeStats: best oldest first, worst newest first
+            ranked = {}
+            for key, order in (("best", "pnl DESC, id"), ("worst", "pnl, id DESC")):
+                cursor.execute(f'''
+                SELECT {STATS_COLUMNS}, pnl FROM trades
+                WHERE user=? AND opened=0 AND pnl IS NOT NULL
+                ORDER BY {order} LIMIT ?
+                ''', (user, limit))
+                ranked[key] = [dict(row) for row in cursor.fetchall()]
+
+            return {"classes": classes, "tickers": tickers, **ranked}
+    except sqlite3.Error as e:
+        print(f"Database error in get_user_aggregates: {e}")
+        return None
+
+# Users need this many won/lost trades to be ranked by win rate
+LEADERBOARD_MIN_DECIDED = 3
+
+# metric -> (ranking column, condition to appear in the ranking). PnL is split like
+# TradeStats: % for options and stocks, points for futures.
+LEADERBOARD_METRICS = {
+    "winrate": ("win_rate", f"wins + losses >= {LEADERBOARD_MIN_DECIDED}"),
+    "pnl": ("pnl_pct", "pct_count > 0"),
+    "points": ("pnl_pts", "pts_count > 0"),
+    "trades": ("trades", "trades > 0"),
+}
+
+def get_leaderboard(timeframe, metric, limit=10):
+    """Rank users by `metric` over `timeframe` from the materialized totals.
+
+    Returns dict rows (user, trades, closed, wins, losses, win_rate, pnl_pct, pnl_pts, ...)
+    best first, or None for an invalid timeframe or metric.
+    """
+    if metric not in LEADERBOARD_METRICS:
+        return None
+    if timeframe == "all":
+        source, params = "trade_aggregates", []
+    elif timeframe in LEADERBOARD_TIMEFRAMES:
+        source, params = "leaderboard WHERE timeframe=?", [timeframe]
+    else:
+        return None
+
+    column, condition = LEADERBOARD_METRICS[metric]
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+            SELECT *, wins * 100.0 / NULLIF(wins + losses, 0) AS win_rate
+            FROM (SELECT user,
+                         SUM(opened_count) AS trades,
+                         SUM(closed_count) AS closed,
+                         SUM(CASE WHEN instrument != 'other' THEN wins ELSE 0 END) AS wins,
+                         SUM(CASE WHEN instrument != 'other' THEN losses ELSE 0 END) AS losses,
+                         TOTAL(CASE WHEN instrument IN ('options', 'stocks') THEN pnl_sum END) AS pnl_pct,
+                         SUM(CASE WHEN instrument IN ('options', 'stocks') THEN pnl_count ELSE 0 END) AS pct_count,
+                         TOTAL(CASE WHEN instrument = 'futures' THEN pnl_sum END) AS pnl_pts,
+                         SUM(CASE WHEN instrument = 'futures' THEN pnl_count ELSE 0 END) AS pts_count
+                  FROM {source} GROUP BY user)
+            WHERE {condition}
+            ORDER BY {column} DESC, trades DESC, user
+            LIMIT ?
+            ''', params + [limit])
+            return [dict(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        print(f"Database error in get_leaderboard: {e}")
+        return None
+
+def iter_closed_pnl(cursor, user, timeframe="all", batch_size=500):
+    """Yield (instrument, pnl, closed_timestamp) of the user's closed trades in closing order.
+
+    Rows are fetched `batch_size` at a time, so the whole history is never held in memory.
+    `timeframe` filters on the opening timestamp, like get_trade_stats.
+    """
+    cursor.execute(f'''
+    SELECT {INSTRUMENT_CLASS_SQL} AS instrument, pnl, closed_timestamp
+    FROM trades
+    WHERE user=? AND opened=0 AND pnl IS NOT NULL AND closed_timestamp IS NOT NULL AND timestamp >= ?
+    ORDER BY closed_timestamp, id
+    ''', (user, timeframe_start(timeframe)))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+def get_equity_stats(user, timeframe="all"):
+    """Equity curve summaries per instrument class (see equity_curve), streamed from the trades.
+
+    Returns {} if the user has no closed trades, or None for an invalid timeframe.
+    """
+    if timeframe_start(timeframe) is None:
+        return None
+    try:
+        with get_db_connection() as conn:
+            return equity_by_class(iter_closed_pnl(conn.cursor(), user, timeframe))
+    except sqlite3.Error as e:
+        print(f"Database error in get_equity_stats: {e}")
+        return None
+
+# Calendar-aligned bucket of a timestamp column: the day, the Monday of its week, or the 1st of its month
+BUCKET_PERIODS = {
+    "day": "date({column})",
+    "week": "date({column}, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m-01', {column})",
+}
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+def _bucket_of(day, period):
+    """The BUCKET_PERIODS bucket of a date, computed in Python."""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+def _next_bucket(bucket, period):
+    if period == "day":
+        return bucket + timedelta(days=1)
+    if period == "week":
+        return bucket + timedelta(days=7)
+    return date(bucket.year + bucket.month // 12, bucket.month % 12 + 1, 1)
+
+def get_bucketed_stats(user, period, start=None, end=None):
+    """Per-day/week/month totals of a user between `start` and `end` (dates, inclusive), in one query.
+
+    Closed trades count in the bucket of their closing time (wins, losses and PnL, split in
+    % for options/stocks and points for futures like TradeStats); "opened" counts trades by
+    opening time. Buckets are calendar-aligned (weeks start on Monday) and returned oldest
+    first, including empty ones, from the first bucket with data (or `start`) to `end`
+    (default today); a bucket cut by `start`/`end` only counts the days inside the range.
+    Returns None for an invalid period or dates.
+    """
+    if period not in BUCKET_PERIODS:
+        return None
+    try:
+        end = _as_date(end) if end is not None else datetime.now().date()
+        start = _as_date(start) if start is not None else None
+    except (TypeError, ValueError):
+        return None
+    lower = start.isoformat() if start else ''
+    upper = (end + timedelta(days=1)).isoformat()  # exclusive
+
+    opened_bucket = BUCKET_PERIODS[period].format(column="timestamp")
+    closed_bucket = BUCKET_PERIODS[period].format(column="closed_timestamp")
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+            SELECT bucket,
+                   SUM(opened_n) AS opened,
+                   SUM(closed_n) AS closed,
+                   IFNULL(SUM(instrument != 'other' AND pnl > 0), 0) AS wins,
+                   IFNULL(SUM(instrument != 'other' AND pnl < 0), 0) AS losses,
+                   TOTAL(CASE WHEN instrument IN ('options', 'stocks') THEN pnl END) AS pnl_pct,
+                   COUNT(CASE WHEN instrument IN ('options', 'stocks') THEN pnl END) AS pct_count,
+                   TOTAL(CASE WHEN instrument = 'futures' THEN pnl END) AS pnl_pts,
+                   COUNT(CASE WHEN instrument = 'futures' THEN pnl END) AS pts_count
+            FROM (SELECT {opened_bucket} AS bucket, 1 AS opened_n, 0 AS closed_n,
+                         NULL AS instrument, NULL AS pnl
+                  FROM trades WHERE user=? AND timestamp >= ? AND timestamp < ?
+                  UNION ALL
+                  SELECT {closed_bucket}, 0, 1, {INSTRUMENT_CLASS_SQL}, pnl
+                  FROM trades WHERE user=? AND opened=0 AND closed_timestamp >= ? AND closed_timestamp < ?)
+            WHERE bucket IS NOT NULL
+            GROUP BY bucket
+            ORDER BY bucket
+            ''', (user, lower, upper, user, lower, upper))
+            rows = {date.fromisoformat(row["bucket"]): dict(row) for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        print(f"Database error in get_bucketed_stats: {e}")
+        return None
+
+    first = start or min(rows, default=None)
+    if first is None:
+        return []
+    # Fill the gaps with empty buckets
+    bucket, last = _bucket_of(first, period), _bucket_of(end, period)
+    buckets = []
+    while bucket <= last:
+        row = rows.get(bucket) or {"opened": 0, "closed": 0, "wins": 0, "losses": 0,
+                                   "pnl_pct": 0.0, "pct_count": 0, "pnl_pts": 0.0, "pts_count": 0}
+        decided = row["wins"] + row["losses"]
+        buckets.append({
+            **row,
+            "bucket": bucket,
+            "win_rate": row["wins"] / decided * 100 if decided else None,
+        })
+        bucket = _next_bucket(bucket, period)
+    return buckets
+
 def get_open_options_expiring_today():
     """Fetch open options trades expiring on or before today."""
     try:
@@ -331,49 +1077,14 @@ def get_open_options_expiring_today():
             cursor = conn.cursor()
             today = datetime.now().date()
 
-            # Obtener todas las opciones abiertas
+            # ISO dates compare correctly as text: one range scan on idx_trades_open_expiration
             query = '''
             SELECT user, ticker, date, strike, type, price, qty
             FROM trades
-            WHERE opened=1 AND type IN ('C', 'P') AND date IS NOT NULL
+            WHERE opened=1 AND expiration <= ? AND type IN ('C', 'P')
             '''
-            cursor.execute(query)
-            all_trades = cursor.fetchall()
-
-            # Filtrar manualmente por fecha
-            expiring_trades = []
-            for trade in all_trades:
-                try:
-                    date_str = trade['date']
-                    parsed = None
-
-                    # Intentar parsear diferentes formatos de fecha
-                    for fmt in ["%m/%d/%y", "%m/%d/%Y", "%-m/%-d/%y", "%-m/%-d/%Y"]:
-                        try:
-                            parsed = datetime.strptime(date_str, fmt)
-                            break
-                        except ValueError:
-                            continue
-
-                    # Si no se pudo parsear con formatos estándar, intentar manualmente
-                    if not parsed:
-                        try:
-                            parts = date_str.split('/')
-                            if len(parts) == 3:
-                                month, day, year = int(parts[0]), int(parts[1]), int(parts[2])
-                                # Agregar siglo si es necesario
-                                if year < 100:
-                                    year = 2000 + year if year < 50 else 1900 + year
-                                parsed = datetime(year, month, day)
-                        except:
-                            pass
-
-                    if parsed and parsed.date() <= today:
-                        expiring_trades.append(trade)
-
-                except Exception as e:
-                    print(f"Error parsing date '{trade['date']}' for {trade['ticker']}: {e}")
-                    continue
+            cursor.execute(query, (today.isoformat(),))
+            expiring_trades = cursor.fetchall()
 
             print(f"Found {len(expiring_trades)} options expiring on or before {today}")
             return expiring_trades
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import sqlite3
+import sys
 from datetime import datetime
+from query_plans import check_query_plans
 
 conn = sqlite3.connect('trades.db')
 conn.row_factory = sqlite3.Row
@@ -70,4 +72,12 @@ for trade in closed:
     print(f"  Cerrado: {trade['closed_timestamp']} @ {trade['closing_price']}")
     print()
 
+print("=" * 80)
+print("PLANES DE CONSULTA (EXPLAIN QUERY PLAN):")
+print("-" * 80)
+# En una DB temporaria migrada, no en trades.db (que puede no estar migrada)
+plans_ok = check_query_plans()
+print()
+
 conn.close()
+sys.exit(0 if plans_ok else 1)
@@ -0,0 +1,81 @@
+"""
+equity_curve.py - Path-dependent trade statistics (equity curve, drawdown, streaks)
+
+Closed trades are consumed one at a time in closing order, so memory stays constant however
+long the history is: feed it straight from a DB cursor (db_handler.iter_closed_pnl).
+PnL is summed per trade like TradeStats: % for options and stocks, points for futures.
+"""
+from typing import Dict, Iterable, Tuple
+
+
+class EquityCurve:
+    """Running equity curve of one instrument class, starting at 0."""
+
+    __slots__ = (
+        "trades", "wins", "losses", "equity", "peak", "peak_at",
+        "max_drawdown", "drawdown_start", "drawdown_end",
+        "losing_streak", "longest_losing_streak", "gross_profit", "gross_loss",
+    )
+
+    def __init__(self):
+        self.trades = self.wins = self.losses = 0
+        self.equity = self.peak = 0.0
+        self.peak_at = None
+        self.max_drawdown = 0.0
+        self.drawdown_start = self.drawdown_end = None
+        self.losing_streak = self.longest_losing_streak = 0
+        self.gross_profit = self.gross_loss = 0.0
+
+    def add(self, pnl: float, closed_at: str = None):
+        """Fold in the next closed trade (in closing order)."""
+        self.trades += 1
+        self.equity += pnl
+        if pnl > 0:
+            self.wins += 1
+            self.gross_profit += pnl
+        elif pnl < 0:
+            self.losses += 1
+            self.gross_loss -= pnl
+
+        # Racha de pérdidas consecutivas (un trade en break-even la corta)
+        if pnl < 0:
+            self.losing_streak += 1
+            self.longest_losing_streak = max(self.longest_losing_streak, self.losing_streak)
+        else:
+            self.losing_streak = 0
+
+        if self.equity > self.peak:
+            self.peak, self.peak_at = self.equity, closed_at
+        elif self.peak - self.equity > self.max_drawdown:
+            self.max_drawdown = self.peak - self.equity
+            self.drawdown_start, self.drawdown_end = self.peak_at, closed_at
+
+    def summary(self) -> Dict:
+        return {
+            "trades": self.trades,
+            "wins": self.wins,
+            "losses": self.losses,
+            "cumulative_pnl": self.equity,
+            "peak": self.peak,
+            "max_drawdown": self.max_drawdown,
+            "drawdown_start": self.drawdown_start,  # None: the peak was the starting 0
+            "drawdown_end": self.drawdown_end,
+            "longest_losing_streak": self.longest_losing_streak,
+            "current_losing_streak": self.losing_streak,
+            "gross_profit": self.gross_profit,
+            "gross_loss": self.gross_loss,
+            # Sin pérdidas el profit factor no está definido
+            "profit_factor": self.gross_profit / self.gross_loss if self.gross_loss else None,
+            "expectancy": self.equity / self.trades if self.trades else None,
+        }
+
+
+def equity_by_class(rows: Iterable[Tuple[str, float, str]]) -> Dict[str, Dict]:
+    """Summaries per instrument class from (instrument, pnl, closed_timestamp) rows in closing order."""
+    curves = {}
+    for instrument, pnl, closed_at in rows:
+        curve = curves.get(instrument)
+        if curve is None:
+            curve = curves[instrument] = EquityCurve()
+        curve.add(pnl, closed_at)
+    return {instrument: curve.summary() for instrument, curve in curves.items()}
@@ -0,0 +1,165 @@
+"""
+futures_roll.py - Calendario de roll de futuros (contrato frontal por raíz)
+
+Para cada raíz se precalculan, sobre varios años, las fechas de roll y el contrato que queda
+como frontal después de cada una; resolver /ES -> /ESZ6 es una búsqueda binaria.
+
+- Raíces mensuales (CL, GC, ZN, SR3, BTC, ...): el frontal es el mes siguiente hasta el
+  vencimiento mensual de opciones (tercer viernes, o jueves si es festivo, 16:00 ET) y
+  pasa a dos meses vista después.
+- Resto (ES, NQ, RTY, YM, ...): ciclo trimestral H/M/U/Z, roll el tercer viernes del mes
+  del contrato.
+"""
+import datetime
+from bisect import bisect_right
+from zoneinfo import ZoneInfo
+
+MONTH_CODES = {
+    1: 'F', 2: 'G', 3: 'H', 4: 'J', 5: 'K', 6: 'M',
+    7: 'N', 8: 'Q', 9: 'U', 10: 'V', 11: 'X', 12: 'Z'
+}
+
+# Contratos con vencimientos mensuales
+MONTHLY_ROOTS = {
+    'CL', 'QM', 'BZ',      # Petróleo
+    'NG', 'QG',            # Gas natural
+    'GC', 'HG', 'PL',      # Metales
+    'VX',                  # Volatilidad
+    'ZT', 'ZF', 'ZN', 'ZB',# Bonos
+    'SR3',                 # SOFR
+    'BTC', 'ETH'           # Criptos
+}
+QUARTERLY_MONTHS = (3, 6, 9, 12)
+
+# Años precalculados hacia delante (se amplía solo si una consulta se sale)
+ROLL_HORIZON_YEARS = 3
+TZ = "America/New_York"
+
+
+def _add_months(year, month, n):
+    month += n
+    return year + (month - 1) // 12, (month - 1) % 12 + 1
+
+
+def _third_friday(year, month):
+    first = datetime.date(year, month, 1)
+    return first + datetime.timedelta(days=(4 - first.weekday()) % 7 + 14)
+
+
+class RollSchedule:
+    """Sorted roll instants for one root; `contracts[i]` is the front month until `rolls[i]`."""
+
+    def __init__(self, root: str, monthly: bool, first_year: int, last_year: int):
+        from utils import trading_calendar
+
+        self.root = root
+        self.monthly = monthly
+        self.first_year, self.last_year = first_year, last_year
+        tz = ZoneInfo(TZ)
+        self.rolls = []
+        self.contracts = []
+        for year in range(first_year, last_year + 1):
+            for month in range(1, 13):
+                if monthly:
+                    opex = trading_calendar.third_friday(year, month) or _third_friday(year, month)
+                    roll = datetime.datetime.combine(opex, datetime.time(16, 0), tzinfo=tz)
+                    contract = _add_months(year, month, 1)
+                elif month in QUARTERLY_MONTHS:
+                    roll = datetime.datetime.combine(_third_friday(year, month), datetime.time(), tzinfo=tz)
+                    contract = (year, month)
+                else:
+                    continue
+                self.rolls.append(roll)
+                self.contracts.append(contract)
+
+    def covers(self, when: datetime.datetime) -> bool:
+        return self.rolls[0] <= when < self.rolls[-1]
+
+    def ticker(self, contract) -> str:
+        year, month = contract
+        return f"/{self.root}{MONTH_CODES[month]}{str(year)[-1]}"
+
+    def front(self, when: datetime.datetime) -> str:
+        """Front-month ticker at `when` (aware datetime)."""
+        return self.ticker(self.contracts[bisect_right(self.rolls, when)])
+
+    def upcoming(self, when: datetime.datetime, count: int = 4):
+        """Next `count` rolls after `when` as (roll datetime, old ticker, new ticker)."""
+        i = bisect_right(self.rolls, when)
+        return [
+            (self.rolls[j], self.ticker(self.contracts[j]), self.ticker(self.contracts[j + 1]))
+            for j in range(i, min(i + count, len(self.rolls) - 1))
+        ]
+
+
+_schedules = {}
+
+
+def _normalize(symbol: str) -> str:
+    return symbol.upper().lstrip("/")  # elimina prefijo "/" si existe
+
+
+def _as_aware(when, tz=TZ) -> datetime.datetime:
+    if when is None:
+        return datetime.datetime.now(ZoneInfo(tz))
+    if not isinstance(when, datetime.datetime):
+        when = datetime.datetime.combine(when, datetime.time())
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=ZoneInfo(tz))
+    return when
+
+
+def get_schedule(symbol: str, monthly: bool = None, when: datetime.datetime = None) -> RollSchedule:
+    """Roll schedule of a root ("/ES", "ES"), built once and widened if `when` falls outside it."""
+    root = _normalize(symbol)
+    if monthly is None:
+        monthly = root in MONTHLY_ROOTS
+    when = _as_aware(when)
+
+    schedule = _schedules.get((root, monthly))
+    if schedule is None or not schedule.covers(when) or not schedule.covers(when + datetime.timedelta(days=400)):
+        first_year = datetime.date.today().year - 1
+        last_year = datetime.date.today().year + ROLL_HORIZON_YEARS
+        if schedule is not None:
+            first_year, last_year = schedule.first_year, schedule.last_year
+        schedule = RollSchedule(root, monthly, min(first_year, when.year - 1), max(last_year, when.year + 2))
+        _schedules[(root, monthly)] = schedule
+    return schedule
+
+
+def front_month(symbol: str, current_date: datetime.datetime = None, monthly: bool = None, tz: str = TZ) -> str:
+    """
+    Ticker del contrato frontal para `symbol` en `current_date` (ahora por defecto).
+    - Acepta símbolos con o sin prefijo "/".
+    - Si `monthly` se especifica, sobrescribe la detección automática.
+    """
+    when = _as_aware(current_date, tz)
+    return get_schedule(symbol, monthly, when).front(when)
+
+
+def upcoming_rolls(symbol: str, count: int = 4, current_date: datetime.datetime = None, monthly: bool = None):
+    """Próximos `count` rolls de `symbol`: [(fecha de roll, contrato saliente, contrato entrante)]."""
+    when = _as_aware(current_date)
+    return get_schedule(symbol, monthly, when).upcoming(when, count)
+
+
+def extract_base_symbol(future_ticker: str) -> str:
+    """
+    Extrae el símbolo base desde un ticker de futuros (e.g., '/ESU5' → '/ES').
+
+    Detecta automáticamente el símbolo base eliminando el código de mes y año.
+    """
+    month_codes = set(MONTH_CODES.values())
+
+    ticker = future_ticker.strip().upper()
+
+    # Buscar código de mes y año en las últimas posiciones
+    if len(ticker) < 3:
+        raise ValueError(f"Ticker demasiado corto: {ticker}")
+
+    # Recorrer desde el final hacia atrás para detectar patrón válido
+    for i in range(len(ticker) - 2, 0, -1):
+        if ticker[i] in month_codes and ticker[i+1].isdigit():
+            return ticker[:i]  # Devuelve todo lo anterior al mes
+
+    raise ValueError(f"No se pudo extraer símbolo base de: {ticker}")
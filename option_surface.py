@@ -0,0 +1,209 @@
+"""
+option_surface.py - Columnar container for downloaded option chains
+
+One row per contract, keyed by streamer symbol. Quotes, Greeks and open interest are
+written straight into typed NumPy columns as REST data and DXLink events arrive, instead of
+being stringified into one dict per contract. `to_records()` rebuilds the old list-of-dicts
+shape for callers that still expect it.
+"""
+import re
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+from tastytrade.dxfeed import Greeks, Summary
+
+QUOTE_COLUMNS = ("ask", "ask_size", "bid", "bid_size", "mid", "last")
+# Greeks event field -> column
+GREEKS_COLUMNS = {
+    "delta": "delta",
+    "gamma": "gamma",
+    "theta": "theta",
+    "vega": "vega",
+    "rho": "rho",
+    "volatility": "vol",
+    "price": "price",
+}
+FLOAT_COLUMNS = QUOTE_COLUMNS + tuple(GREEKS_COLUMNS.values())
+
+NY = ZoneInfo("America/New_York")
+
+
+# C/P followed by the strike at the end: "SPXW  260212C06900000", "./ESZ5 E3AZ5 251219P6900"
+_OPTION_TYPE = re.compile(r"([CP])[\d.]+$")
+
+
+def _is_call(option: str) -> bool:
+    match = _OPTION_TYPE.search(option)
+    return match is not None and match.group(1) == "C"
+
+
+def _num(value):
+    return np.nan if value is None else float(value)
+
+
+def _text(value):
+    """Value as the old dicts carried it: missing (NaN) -> "None", like str(None)."""
+    if value != value:  # NaN
+        return "None"
+    return str(value)
+
+
+class OptionSurface:
+    """
+    Contracts of one download as parallel columns.
+
+    Identity columns: symbol (streamer symbol), option, ticker, strike (text as listed in the
+    chain), strike_price (float64), expiration (datetime64[D]), is_call (bool).
+    Data columns: float64 quotes and Greeks (NaN when missing), int64 open_interest, time
+    (datetime64[s], UTC) and has_quote/has_greeks/has_summary masks.
+    """
+
+    def __init__(self, symbols, options, strikes, expirations):
+        n = len(symbols)
+        self.symbol = np.array(symbols, dtype=object)
+        self.option = np.array(options, dtype=object)
+        self.ticker = np.array([o.split()[0] for o in options], dtype=object)
+        self.strike = np.array(strikes, dtype=object)
+        self.strike_price = np.array([float(s) for s in strikes], dtype=np.float64)
+        self.expiration = np.array(expirations, dtype="datetime64[D]")
+        self.is_call = np.array([_is_call(o) for o in options], dtype=bool)
+
+        self.columns = {name: np.full(n, np.nan) for name in FLOAT_COLUMNS}
+        self.open_interest = np.zeros(n, dtype=np.int64)
+        self.time = np.full(n, np.datetime64("NaT"), dtype="datetime64[s]")
+        self.has_quote = np.zeros(n, dtype=bool)
+        self.has_greeks = np.zeros(n, dtype=bool)
+        self.has_summary = np.zeros(n, dtype=bool)
+
+        self.index = {s: i for i, s in enumerate(self.symbol)}
+        self.by_option = {o: i for i, o in enumerate(self.option)}
+
+    def __len__(self):
+        return len(self.symbol)
+
+    def __getitem__(self, name):
+        return self.columns[name] if name in self.columns else getattr(self, name)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [])
+
+    @classmethod
+    def from_chains(cls, chains_list, start_date, end_date, lower_strike, upper_strike, only_strikes=None):
+        """Rows for every contract of the cached chains inside the date/strike window (only `only_strikes`, if given)."""
+        symbols, options, strikes, expirations = [], [], [], []
+        seen = set()
+        lower, upper = float(lower_strike), float(upper_strike)
+        wanted = None if only_strikes is None else {float(s) for s in only_strikes}
+        for chain in chains_list:
+            for (exp_date, strike_price, _), (strike_text, option, streamer_symbol) in chain.index.items():
+                if not (start_date <= exp_date <= end_date):
+                    continue
+                if not (lower <= strike_price <= upper):
+                    continue
+                if wanted is not None and strike_price not in wanted:
+                    continue
+                key = str(streamer_symbol)
+                if key in seen:
+                    continue
+                seen.add(key)
+                symbols.append(key)
+                options.append(str(option))
+                strikes.append(strike_text)
+                expirations.append(exp_date)
+        return cls(symbols, options, strikes, expirations)
+
+    @classmethod
+    def concat(cls, surfaces):
+        """One surface with the rows of `surfaces` in order (a symbol keeps its first row)."""
+        surfaces = [s for s in surfaces if len(s)]
+        if not surfaces:
+            return cls.empty()
+        if len(surfaces) == 1:
+            return surfaces[0]
+
+        symbols = np.concatenate([s.symbol for s in surfaces])
+        _, first = np.unique(symbols, return_index=True)
+        keep = np.sort(first)
+
+        out = cls.__new__(cls)
+        for name in ("symbol", "option", "ticker", "strike", "strike_price", "expiration", "is_call",
+                     "open_interest", "time", "has_quote", "has_greeks", "has_summary"):
+            setattr(out, name, np.concatenate([getattr(s, name) for s in surfaces])[keep])
+        out.columns = {name: np.concatenate([s.columns[name] for s in surfaces])[keep] for name in FLOAT_COLUMNS}
+        out.index = {s: i for i, s in enumerate(out.symbol)}
+        out.by_option = {o: i for i, o in enumerate(out.option)}
+        return out
+
+    def apply_market_data(self, data):
+        """Merge REST market data, keyed by option symbol."""
+        columns = self.columns
+        for i in data:
+            row = self.by_option.get(str(i.symbol))
+            if row is None:
+                continue
+            columns["ask"][row] = _num(i.ask)
+            columns["ask_size"][row] = _num(i.ask_size)
+            columns["bid"][row] = _num(i.bid)
+            columns["bid_size"][row] = _num(i.bid_size)
+            columns["mid"][row] = _num(i.mid)
+            columns["last"][row] = _num(i.last)
+            self.time[row] = np.datetime64(int(i.updated_at.timestamp()), "s")
+            self.has_quote[row] = True
+
+    def apply_event(self, event_type, event):
+        """Route one DXLink event to its row. Returns False for symbols we did not request."""
+        row = self.index.get(event.event_symbol)
+        if row is None:
+            return False
+        if event_type == Greeks:
+            columns = self.columns
+            for field, column in GREEKS_COLUMNS.items():
+                columns[column][row] = _num(getattr(event, field))
+            self.has_greeks[row] = True
+        elif event_type == Summary:
+            self.open_interest[row] = event.open_interest or 0
+            self.has_summary[row] = True
+        return True
+
+    def to_frame(self) -> pd.DataFrame:
+        """Typed DataFrame indexed by streamer symbol."""
+        frame = pd.DataFrame({
+            "option": self.option,
+            "ticker": self.ticker,
+            "strike": self.strike,
+            "strike_price": self.strike_price,
+            "expiration": self.expiration,
+            "is_call": self.is_call,
+            **self.columns,
+            "open_interest": self.open_interest,
+            "time": self.time,
+        }, index=pd.Index(self.symbol, name="symbol"))
+        return frame
+
+    def to_records(self) -> list:
+        """The old main_downloader shape: one dict of strings per contract."""
+        times = pd.DatetimeIndex(self.time).tz_localize("UTC").tz_convert(NY).strftime("%Y-%m-%d %H:%M:%S")
+        expirations = self.expiration.astype(object)
+        columns = self.columns
+        records = []
+        for row in range(len(self.symbol)):
+            record = {
+                "expiration": expirations[row],
+                "strike": self.strike[row],
+                "option": self.option[row],
+                "symbol": self.symbol[row],
+            }
+            if self.has_quote[row]:
+                record["ticker"] = self.ticker[row]
+                for name in QUOTE_COLUMNS:
+                    record[name] = _text(columns[name][row])
+                record["time"] = times[row]
+            if self.has_greeks[row]:
+                for column in GREEKS_COLUMNS.values():
+                    record[column] = _text(columns[column][row])
+            if self.has_summary[row]:
+                record["open_interest"] = str(self.open_interest[row])
+            records.append(record)
+        return records
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+query_plans.py - EXPLAIN QUERY PLAN checks on a fresh migrated database (only needs db_handler)
+
+    python query_plans.py             # exit 1 si alguna consulta hace SCAN trades
+"""
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import db_handler
+
+
+@contextmanager
+def temporary_db():
+    """Point db_handler at a new database in a temporary directory, built through migrate()."""
+    original = db_handler.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        db_handler.close_db_connections()
+        db_handler.DB_PATH = str(Path(tmp) / "trades.db")
+        try:
+            db_handler.migrate()
+            yield db_handler
+        finally:
+            db_handler.close_db_connections()
+            db_handler.DB_PATH = original
+
+
+def check_query_plans():
+    """EXPLAIN every db_handler.QUERY_PLAN_CHECKS query on a fresh migrated DB; False on any SCAN trades."""
+    with temporary_db() as db:
+        plans = {label: db.explain_query_plan(query, params) for label, query, params in db.QUERY_PLAN_CHECKS}
+        regressions = db.check_query_plans()
+
+    print("Query plans (fresh migrated DB)")
+    for label, plan in plans.items():
+        print(f"{'FAIL' if label in regressions else 'ok':>4}  {label}: {' | '.join(plan)}")
+    return not regressions
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_query_plans() else 1)
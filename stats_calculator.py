@@ -1,117 +1,203 @@
 """
 stats_calculator.py - Advanced statistics calculator for trades
 """
+from collections import Counter
 from typing import List, Dict, Tuple
-from datetime import datetime
+from datetime import datetime, timezone
+
+from equity_curve import equity_by_class
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+INSTRUMENT_CLASSES = ("options", "stocks", "futures")
+
+
+def position_size(trade: Dict) -> float:
+    """Cantidad total comprada (Inicial + Avg Downs), mantenida en entry_qty"""
+    entry_qty = trade.get("entry_qty")
+    return entry_qty if entry_qty else trade.get("qty", 0)
+
+
+def entry_price(trade: Dict) -> float:
+    """Average entry price including avg-downs (Ponderado), maintained from the fills"""
+    entry_avg = trade.get("entry_avg")
+    return entry_avg if entry_avg is not None else trade["price"]
+
+
+def exit_price(trade: Dict) -> float:
+    """
+    WEIGHTED average exit price, maintained from the exit fills.
+    Logic: (Trim1*Qty1 + Trim2*Qty2 + Close*RemainingQty) / TotalQty
+    """
+    if position_size(trade) == 0:
+        return None
+
+    exit_avg = trade.get("exit_avg")
+    if exit_avg is not None:
+        return exit_avg
+    # Sin fills de salida: usar el precio de cierre simple
+    return trade.get("closing_price")
+
+
+def trade_pnl(trade: Dict) -> Tuple[float, str]:
+    """Calculates trade PnL (value, type)"""
+    avg_entry = entry_price(trade)
+    avg_exit = exit_price(trade)
+    
+    if avg_exit is None:
+        return None, None
+    
+    is_long = trade["type"] in ["L", "C"]
+    ticker = trade["ticker"]
+    
+    # Futures (points)
+    if '/' in ticker:
+        pnl = (avg_exit - avg_entry) if is_long else (avg_entry - avg_exit)
+        return pnl, "pts"
+    # Options and Stocks (percentage)
+    else:
+        try:
+            pnl = ((avg_exit - avg_entry) / avg_entry * 100) if is_long else \
+                  ((avg_entry - avg_exit) / avg_entry * 100)
+            return pnl, "%"
+        except ZeroDivisionError:
+            return None, None
+
+
+def _to_epoch_seconds(values, np):
+    """'%Y-%m-%d %H:%M:%S' strings -> int64 epoch seconds, with a mask of the parseable ones."""
+    seconds = np.zeros(len(values), dtype=np.int64)
+    valid = np.array([isinstance(v, str) and len(v) == 19 for v in values], dtype=bool)
+    rows = np.flatnonzero(valid)
+    try:
+        # numpy acepta "YYYY-MM-DD HH:MM:SS" directamente
+        seconds[rows] = np.array([values[i] for i in rows], dtype="datetime64[s]").astype(np.int64)
+        return seconds, valid
+    except ValueError:
+        pass
+    for i in rows:
+        try:
+            seconds[i] = int(datetime.strptime(values[i], TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc).timestamp())
+        except ValueError:
+            valid[i] = False
+    return seconds, valid
+
+
+def _activity(ticker_counts: Dict, avg_downs: int, trims: int) -> Dict:
+    """Activity section from the per-ticker counts (in first-traded order) and the totals."""
+    most_traded = max(ticker_counts.items(), key=lambda x: x[1]) if ticker_counts else (None, 0)
+    
+    return {
+        "most_traded_ticker": most_traded[0],
+        "most_traded_count": most_traded[1],
+        "trades_per_ticker": ticker_counts,
+        "avg_downs_used": avg_downs,
+        "trims_used": trims,
+        "unique_tickers": len(ticker_counts),
+    }
+
+
+def format_equity_line(name: str, curve: Dict) -> str:
+    """One report line for an equity_curve summary"""
+    unit = "pts" if name == "futures" else "%"
+    if curve["profit_factor"] is not None:
+        pf = f"{curve['profit_factor']:.2f}"
+    else:
+        pf = "∞" if curve["gross_profit"] else "-"
+    return (f"{name.capitalize()}: Max DD -{curve['max_drawdown']:.2f}{unit} | "
+            f"PF {pf} | Exp {curve['expectancy']:+.2f}{unit} | "
+            f"Worst streak {curve['longest_losing_streak']}L")
+
 
 class TradeStats:
-    """Calculates detailed trade statistics"""
+    """
+    Calculates detailed trade statistics.
+
+    Closed trades are loaded once into NumPy arrays (entry/exit averages, quantity, side,
+    instrument class, open/close epoch seconds); PnL, win rates, best/worst and hold times
+    all come from that single pass and are memoized on the instance.
+    """
     
     def __init__(self, trades: List[Dict]):
         self.trades = trades
         self.closed_trades = [t for t in trades if t["opened"] == 0]
         self.open_trades = [t for t in trades if t["opened"] == 1]
+        self._cache = {}
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
     
     def _get_total_position_size(self, trade: Dict) -> float:
-            """Helper: Calcula la cantidad total comprada (Inicial + Avg Downs)"""
-            qty = trade.get("qty", 0)
-            if trade.get("avg_down1") is not None:
-                qty += trade.get("avg_down1_qty", 0)
-            if trade.get("avg_down2") is not None:
-                qty += trade.get("avg_down2_qty", 0)
-            return qty
+        return position_size(trade)
     
     def _calculate_entry_price(self, trade: Dict) -> float:
-        """Calculates average entry price including avg-downs (Ponderado)"""
-        # Nota: Usamos .get() para evitar errores si falta alguna clave
-        prices = [(trade.get("price"), trade.get("qty", 0))]
-        
-        if trade.get("avg_down1") is not None:
-            prices.append((trade.get("avg_down1"), trade.get("avg_down1_qty", 0)))
-        if trade.get("avg_down2") is not None:
-            prices.append((trade.get("avg_down2"), trade.get("avg_down2_qty", 0)))
-        
-        total_qty = sum(q for _, q in prices)
-        return sum(p * q for p, q in prices) / total_qty if total_qty > 0 else trade["price"]
+        return entry_price(trade)
 
     def _calculate_exit_price(self, trade: Dict) -> float:
-        """
-        Calculates WEIGHTED average exit price.
-        Logic: (Trim1*Qty1 + Trim2*Qty2 + Close*RemainingQty) / TotalQty
-        """
-        total_qty = self._get_total_position_size(trade)
-        
-        if total_qty == 0:
-            return None
+        return exit_price(trade)
 
-        exits = []
-        qty_sold_so_far = 0
+    @property
+    def arrays(self) -> Dict:
+        """Closed trades as typed arrays plus the vectorized PnL (NaN where it is undefined)."""
+        return self._memo("arrays", self._build_arrays)
+
+    def _build_arrays(self) -> Dict:
+        import numpy as np
+
+        closed = self.closed_trades
+        n = len(closed)
+
+        def column(key):
+            # None -> NaN
+            return np.array([t.get(key) for t in closed], dtype=np.float64)
+
+        # Misma lógica que _calculate_entry_price/_calculate_exit_price, por columnas
+        qty = column("entry_qty")
+        qty = np.where(np.isnan(qty) | (qty == 0), np.nan_to_num(column("qty")), qty)
+        entry = column("entry_avg")
+        entry = np.where(np.isnan(entry), column("price"), entry)
+        exit_ = column("exit_avg")
+        exit_ = np.where(np.isnan(exit_), column("closing_price"), exit_)
+        exit_[qty == 0] = np.nan
+        types = np.array([t["type"] or "" for t in closed], dtype=object)
+        is_long = np.isin(types, ("L", "C"))
+        is_future = np.array(['/' in t["ticker"] for t in closed], dtype=bool)
+        is_option = ~is_future & np.isin(types, ("C", "P"))
+        is_stock = ~is_future & ~is_option & np.isin(types, ("S", "L"))
+        # 0 = options, 1 = stocks, 2 = futures, -1 = sin clase
+        instrument = np.full(n, -1, dtype=np.int8)
+        instrument[is_option] = 0
+        instrument[is_stock] = 1
+        instrument[is_future] = 2
+
+        # Futures en puntos; opciones y acciones en % sobre la entrada
+        diff = np.where(is_long, exit_ - entry, entry - exit_)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pnl = np.where(is_future, diff, diff / entry * 100)
+        pnl[~is_future & (entry == 0)] = np.nan
+        valid = ~np.isnan(pnl)
+
+        opened_at, opened_ok = _to_epoch_seconds([t["timestamp"] for t in closed], np)
+        closed_at, closed_ok = _to_epoch_seconds([t["closed_timestamp"] for t in closed], np)
+
+        return {
+            "entry": entry,
+            "exit": exit_,
+            "qty": qty,
+            "is_long": is_long,
+            "instrument": instrument,
+            "is_future": is_future,
+            "pnl": pnl,
+            "valid": valid,
+            "opened_at": opened_at,
+            "closed_at": closed_at,
+            "closed_ok": closed_ok,
+            "has_times": opened_ok & closed_ok,
+        }
 
-        # 1. Procesar Trims (Parciales)
-        # Busca trim1 y trim1_qty, trim2 y trim2_qty, etc.
-        for i in range(1, 5):
-            p_key = f"trim{i}"
-            q_key = f"trim{i}_qty"
-            
-            t_price = trade.get(p_key)
-            # Si no existe la key _qty en el dict, asumimos 0 (esto es una protección)
-            t_qty = trade.get(q_key, 0)
-            
-            if t_price is not None:
-                # Si el usuario olvidó poner trim_qty pero puso precio, 
-                # esto podría causar error de cálculo. Asumimos que los datos están bien.
-                exits.append((t_price, t_qty))
-                qty_sold_so_far += t_qty
-
-        # 2. Procesar Cierre Final (Closing Price)
-        # La cantidad de cierre es lo que sobra del total menos los trims
-        closing_price = trade.get("closing_price")
-        remaining_qty = total_qty - qty_sold_so_far
-        
-        if closing_price is not None:
-            # Si remaining_qty es 0 o negativo, algo anda mal con los datos, 
-            # pero matemáticamente solo sumamos si queda algo.
-            if remaining_qty > 0:
-                exits.append((closing_price, remaining_qty))
-            elif not exits: 
-                # Si no hubo trims y remaining es 0 (error de data), devolvemos precio de cierre simple
-                return closing_price
-
-        if not exits:
-            return None
-
-        # 3. Calcular Promedio Ponderado
-        total_exit_value = sum(p * q for p, q in exits)
-        total_exit_qty = sum(q for _, q in exits)
-        
-        if total_exit_qty == 0:
-            return None
-            
-        return total_exit_value / total_exit_qty
-        
     def _calculate_pnl(self, trade: Dict) -> Tuple[float, str]:
-        """Calculates trade PnL (value, type)"""
-        avg_entry = self._calculate_entry_price(trade)
-        avg_exit = self._calculate_exit_price(trade)
-        
-        if avg_exit is None:
-            return None, None
-        
-        is_long = trade["type"] in ["L", "C"]
-        ticker = trade["ticker"]
-        
-        # Futures (points)
-        if '/' in ticker:
-            pnl = (avg_exit - avg_entry) if is_long else (avg_entry - avg_exit)
-            return pnl, "pts"
-        # Options and Stocks (percentage)
-        else:
-            try:
-                pnl = ((avg_exit - avg_entry) / avg_entry * 100) if is_long else \
-                      ((avg_entry - avg_exit) / avg_entry * 100)
-                return pnl, "%"
-            except ZeroDivisionError:
-                return None, None
+        return trade_pnl(trade)
     
     def get_basic_stats(self) -> Dict:
         """Basic statistics"""
@@ -123,46 +209,23 @@ class TradeStats:
     
     def get_pnl_by_type(self) -> Dict:
         """Average PnL by instrument type"""
-        options_pnl = []
-        stocks_pnl = []
-        futures_pnl = []
-        
-        for trade in self.closed_trades:
-            pnl, pnl_type = self._calculate_pnl(trade)
-            if pnl is None:
-                continue
-            
-            # Check futures FIRST (by ticker), then options (by type)
-            if '/' in trade["ticker"]:
-                futures_pnl.append(pnl)
-            elif trade["type"] in ["C", "P"]:
-                options_pnl.append(pnl)
-            elif trade["type"] in ["S", "L"]:
-                stocks_pnl.append(pnl)
-        
-        return {
-            "options": {
-                "avg": sum(options_pnl) / len(options_pnl) if options_pnl else None,
-                "count": len(options_pnl),
-                "total": sum(options_pnl) if options_pnl else 0,
-                "wins": sum(1 for p in options_pnl if p > 0),
-                "losses": sum(1 for p in options_pnl if p < 0),
-            },
-            "stocks": {
-                "avg": sum(stocks_pnl) / len(stocks_pnl) if stocks_pnl else None,
-                "count": len(stocks_pnl),
-                "total": sum(stocks_pnl) if stocks_pnl else 0,
-                "wins": sum(1 for p in stocks_pnl if p > 0),
-                "losses": sum(1 for p in stocks_pnl if p < 0),
-            },
-            "futures": {
-                "avg": sum(futures_pnl) / len(futures_pnl) if futures_pnl else None,
-                "count": len(futures_pnl),
-                "total": sum(futures_pnl) if futures_pnl else 0,
-                "wins": sum(1 for p in futures_pnl if p > 0),
-                "losses": sum(1 for p in futures_pnl if p < 0),
+        return self._memo("pnl_by_type", self._pnl_by_type)
+
+    def _pnl_by_type(self) -> Dict:
+        a = self.arrays
+        result = {}
+        for code, name in enumerate(INSTRUMENT_CLASSES):
+            pnl = a["pnl"][a["valid"] & (a["instrument"] == code)]
+            count = len(pnl)
+            total = float(pnl.sum()) if count else 0
+            result[name] = {
+                "avg": total / count if count else None,
+                "count": count,
+                "total": total,
+                "wins": int((pnl > 0).sum()),
+                "losses": int((pnl < 0).sum()),
             }
-        }
+        return result
     
     def get_win_rate(self) -> Dict:
         """Calculates win rate by category"""
@@ -179,37 +242,50 @@ class TradeStats:
             "stocks": calc_win_rate(pnl_stats["stocks"]),
             "futures": calc_win_rate(pnl_stats["futures"]),
             "overall": calc_win_rate({
-                "wins": sum(pnl_stats[k]["wins"] for k in ["options", "stocks", "futures"]),
-                "losses": sum(pnl_stats[k]["losses"] for k in ["options", "stocks", "futures"])
+                "wins": sum(pnl_stats[k]["wins"] for k in INSTRUMENT_CLASSES),
+                "losses": sum(pnl_stats[k]["losses"] for k in INSTRUMENT_CLASSES)
             })
         }
     
     def get_best_worst_trades(self, limit=3) -> Dict:
         """Returns best and worst trades"""
-        trades_with_pnl = []
-        
-        for trade in self.closed_trades:
-            pnl, pnl_type = self._calculate_pnl(trade)
-            if pnl is not None:
-                trades_with_pnl.append({
-                    "trade": trade,
-                    "pnl": pnl,
-                    "pnl_type": pnl_type
-                })
-        
-        if not trades_with_pnl:
+        return self._memo(("best_worst", limit), lambda: self._best_worst(limit))
+
+    def _best_worst(self, limit) -> Dict:
+        import numpy as np
+
+        a = self.arrays
+        rows = np.flatnonzero(a["valid"])
+        if not len(rows) or limit <= 0:
             return {"best": [], "worst": []}
-        
-        # Sort by PnL
-        sorted_trades = sorted(trades_with_pnl, key=lambda x: x["pnl"], reverse=True)
-        
-        return {
-            "best": sorted_trades[:limit],
-            "worst": sorted_trades[-limit:][::-1]  # Reverse to show worst to better
-        }
+        pnl = a["pnl"][rows]
+        k = min(limit, len(rows))
+
+        def pick(values, order_ties):
+            # argpartition acota los candidatos; los empates en el corte entran todos y se
+            # ordenan como el sort estable anterior (por posición)
+            cutoff = values[np.argpartition(values, k - 1)[k - 1]]
+            candidates = np.flatnonzero(values <= cutoff)
+            order = np.lexsort((order_ties(candidates), values[candidates]))[:k]
+            return candidates[order]
+
+        best = pick(-pnl, lambda c: c)        # PnL desc, empates por orden original
+        worst = pick(pnl, lambda c: -c)       # PnL asc, empates del último al primero
+
+        def items(selected):
+            return [{
+                "trade": self.closed_trades[rows[i]],
+                "pnl": float(pnl[i]),
+                "pnl_type": "pts" if a["is_future"][rows[i]] else "%",
+            } for i in selected]
+
+        return {"best": items(best), "worst": items(worst)}
     
     def get_trading_activity(self) -> Dict:
         """Trading activity analysis"""
+        return self._memo("activity", self._trading_activity)
+
+    def _trading_activity(self) -> Dict:
         if not self.trades:
             return {
                 "most_traded_ticker": None,
@@ -219,80 +295,60 @@ class TradeStats:
             }
         
         # Count trades per ticker
-        ticker_counts = {}
-        total_avg_downs = 0
-        total_trims = 0
-        
-        for trade in self.trades:
-            ticker = trade["ticker"]
-            ticker_counts[ticker] = ticker_counts.get(ticker, 0) + 1
-            
-            # Count avg-downs
-            if trade["avg_down1"] is not None:
-                total_avg_downs += 1
-            if trade["avg_down2"] is not None:
-                total_avg_downs += 1
-            
-            # Count trims
-            for trim in [trade["trim1"], trade["trim2"], trade["trim3"], trade["trim4"]]:
-                if trim is not None:
-                    total_trims += 1
-        
-        most_traded = max(ticker_counts.items(), key=lambda x: x[1]) if ticker_counts else (None, 0)
-        
-        return {
-            "most_traded_ticker": most_traded[0],
-            "most_traded_count": most_traded[1],
-            "trades_per_ticker": ticker_counts,
-            "avg_downs_used": total_avg_downs,
-            "trims_used": total_trims,
-            "unique_tickers": len(ticker_counts),
-        }
+        ticker_counts = dict(Counter(t["ticker"] for t in self.trades))
+        total_avg_downs = sum(t.get("avg_down_count") or 0 for t in self.trades)
+        total_trims = sum(t.get("trim_count") or 0 for t in self.trades)
+        return _activity(ticker_counts, total_avg_downs, total_trims)
     
     def get_time_analysis(self) -> Dict:
         """Temporal analysis of trades"""
+        return self._memo("time", self._time_analysis)
+
+    def _time_analysis(self) -> Dict:
+        import numpy as np
+
+        empty = {
+            "avg_hold_time_hours": None,
+            "avg_hold_time_days": None,
+            "shortest_trade": None,
+            "longest_trade": None,
+        }
         if not self.closed_trades:
-            return {
-                "avg_hold_time_hours": None,
-                "avg_hold_time_days": None,
-                "shortest_trade": None,
-                "longest_trade": None,
-            }
-        
-        hold_times = []
-        
-        for trade in self.closed_trades:
-            if trade["timestamp"] and trade["closed_timestamp"]:
-                try:
-                    opened = datetime.strptime(trade["timestamp"], "%Y-%m-%d %H:%M:%S")
-                    closed = datetime.strptime(trade["closed_timestamp"], "%Y-%m-%d %H:%M:%S")
-                    hold_time = (closed - opened).total_seconds() / 3600  # hours
-                    hold_times.append({
-                        "trade": trade,
-                        "hours": hold_time
-                    })
-                except:
-                    continue
-        
-        if not hold_times:
-            return {
-                "avg_hold_time_hours": None,
-                "avg_hold_time_days": None,
-                "shortest_trade": None,
-                "longest_trade": None,
-            }
-        
-        avg_hours = sum(t["hours"] for t in hold_times) / len(hold_times)
-        shortest = min(hold_times, key=lambda x: x["hours"])
-        longest = max(hold_times, key=lambda x: x["hours"])
+            return empty
+
+        a = self.arrays
+        rows = np.flatnonzero(a["has_times"])
+        if not len(rows):
+            return empty
+
+        hours = (a["closed_at"][rows] - a["opened_at"][rows]) / 3600
+        avg_hours = float(hours.mean())
+        shortest, longest = int(hours.argmin()), int(hours.argmax())
         
         return {
             "avg_hold_time_hours": avg_hours,
             "avg_hold_time_days": avg_hours / 24,
-            "shortest_trade": shortest,
-            "longest_trade": longest,
+            "shortest_trade": {"trade": self.closed_trades[rows[shortest]], "hours": float(hours[shortest])},
+            "longest_trade": {"trade": self.closed_trades[rows[longest]], "hours": float(hours[longest])},
         }
     
+    def get_equity_stats(self) -> Dict:
+        """Equity curve, drawdown, streaks, profit factor and expectancy per instrument class"""
+        return self._memo("equity", self._equity_stats)
+
+    def _equity_stats(self) -> Dict:
+        import numpy as np
+
+        a = self.arrays
+        rows = np.flatnonzero(a["valid"] & a["closed_ok"])
+        # Orden de cierre; empates por orden original (como ORDER BY closed_timestamp, id)
+        rows = rows[np.argsort(a["closed_at"][rows], kind="stable")]
+        names = INSTRUMENT_CLASSES + ("other",)  # instrument -1 -> "other"
+        return equity_by_class(
+            (names[a["instrument"][i]], float(a["pnl"][i]), self.closed_trades[i]["closed_timestamp"])
+            for i in rows
+        )
+
     def format_comprehensive_report(self) -> str:
         """Generates a comprehensive report in readable format"""
         basic = self.get_basic_stats()
@@ -301,6 +357,7 @@ class TradeStats:
         activity = self.get_trading_activity()
         time_stats = self.get_time_analysis()
         best_worst = self.get_best_worst_trades(limit=3)
+        equity = self.get_equity_stats()
         
         report = []
         
@@ -335,6 +392,14 @@ class TradeStats:
             if pnl["futures"]["avg"] is not None and pnl["futures"]["count"] > 0:
                 sign = "+" if pnl["futures"]["avg"] >= 0 else ""
                 report.append(f"Futures: {sign}{pnl['futures']['avg']:.2f}pts (Total: {sign}{pnl['futures']['total']:.2f}pts)")
+            
+            # Equity curve
+            if any(name in equity for name in INSTRUMENT_CLASSES):
+                report.append("")
+                report.append("⚖️ **DRAWDOWN & EXPECTANCY**")
+                for name in INSTRUMENT_CLASSES:
+                    if name in equity:
+                        report.append(format_equity_line(name, equity[name]))
         
         # Activity
         report.append("")
@@ -378,3 +443,80 @@ class TradeStats:
                 report.append(f"{i}. {ticker_str}: {pnl_str}")
         
         return "\n".join(report)
+
+
+class AggregateStats(TradeStats):
+    """
+    Same report as TradeStats, read from the per-user aggregates kept by db_handler
+    (db_handler.get_user_aggregates) instead of the user's whole trade history.
+
+    Hold-time extremes are known only in hours: shortest/longest carry no trade. The equity
+    section needs the `equity` summaries of db_handler.get_equity_stats.
+    """
+
+    def __init__(self, aggregates: Dict, equity: Dict = None):
+        self.aggregates = aggregates
+        self.equity = equity or {}
+        self.classes = aggregates["classes"]
+        self._cache = {}
+
+    def _sum(self, key):
+        return sum(row[key] for row in self.classes.values())
+
+    def get_basic_stats(self) -> Dict:
+        total, closed = self._sum("opened_count"), self._sum("closed_count")
+        return {
+            "total_trades": total,
+            "open_trades": total - closed,
+            "closed_trades": closed,
+        }
+
+    def _pnl_by_type(self) -> Dict:
+        result = {}
+        for name in INSTRUMENT_CLASSES:
+            row = self.classes.get(name)
+            count = row["pnl_count"] if row else 0
+            total = row["pnl_sum"] if count else 0
+            result[name] = {
+                "avg": total / count if count else None,
+                "count": count,
+                "total": total,
+                "wins": row["wins"] if row else 0,
+                "losses": row["losses"] if row else 0,
+            }
+        return result
+
+    def _best_worst(self, limit) -> Dict:
+        def items(rows):
+            return [{
+                "trade": trade,
+                "pnl": trade["pnl"],
+                "pnl_type": "pts" if '/' in trade["ticker"] else "%",
+            } for trade in rows[:max(limit, 0)]]
+
+        return {"best": items(self.aggregates["best"]), "worst": items(self.aggregates["worst"])}
+
+    def _equity_stats(self) -> Dict:
+        # Path-dependent: streamed from the trades by db_handler.get_equity_stats
+        return self.equity
+
+    def _trading_activity(self) -> Dict:
+        return _activity(self.aggregates["tickers"], self._sum("avg_downs"), self._sum("trims"))
+
+    def _time_analysis(self) -> Dict:
+        count = self._sum("hold_count")
+        if not count:
+            return {
+                "avg_hold_time_hours": None,
+                "avg_hold_time_days": None,
+                "shortest_trade": None,
+                "longest_trade": None,
+            }
+        avg_hours = self._sum("hold_sum") / count / 3600
+        held = [row for row in self.classes.values() if row["hold_count"]]
+        return {
+            "avg_hold_time_hours": avg_hours,
+            "avg_hold_time_days": avg_hours / 24,
+            "shortest_trade": {"trade": None, "hours": min(row["hold_min"] for row in held) / 3600},
+            "longest_trade": {"trade": None, "hours": max(row["hold_max"] for row in held) / 3600},
+        }
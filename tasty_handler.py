@@ -1,122 +1,121 @@
 import asyncio
-import re
 from collections import defaultdict
-from decimal import Decimal
+from contextlib import asynccontextmanager
 # Documentation: https://tastyworks-api.readthedocs.io/en/latest/market-data.html
 # Documentation: https://pypi.org/project/tastytrade/ 
-from tastytrade import Session, DXLinkStreamer
-from tastytrade.instruments import NestedOptionChain,NestedFutureOptionChain, get_option_chain
+from tastytrade import DXLinkStreamer
+from tastytrade.instruments import Future, NestedOptionChain,NestedFutureOptionChain
 from tastytrade.market_data import get_market_data_by_type
-from tastytrade.utils import get_tasty_monthly
-from tastytrade.dxfeed import Greeks, Summary
+from tastytrade.dxfeed import Greeks, Summary, Quote, Trade
 from zoneinfo import ZoneInfo
-import time, os, orjson
-from typing import TypedDict, List, Tuple
+from option_surface import OptionSurface
+from futures_roll import front_month as get_future_ticker, extract_base_symbol
+from cachetools import TTLCache
+import inspect
+import time
+from typing import TypedDict, NotRequired, List, Tuple
 import datetime
 
 
-def get_future_ticker(symbol: str, current_date: datetime.datetime = None, monthly: bool = None) -> str:
-    """
-    Devuelve el ticker de futuros siguiente a la fecha actual para el símbolo dado.
-    - Detecta automáticamente si el contrato es mensual o trimestral según el símbolo.
-    - Acepta símbolos con o sin prefijo "/".
-    - Si `monthly` se especifica, sobrescribe la detección automática.
-    """
-    if current_date is None:
-        current_date = datetime.datetime.utcnow()
-
-    symbol = symbol.upper().lstrip("/")  # elimina prefijo "/" si existe
-
-    # Contratos con vencimientos mensuales
-    monthly_contracts = {
-        'CL', 'QM', 'BZ',      # Petróleo
-        'NG', 'QG',            # Gas natural
-        'GC', 'HG', 'PL',# Metales
-        'VX',                  # Volatilidad
-        'ZT', 'ZF', 'ZN', 'ZB',# Bonos
-        'SR3',                 # RBA
-        'BTC', 'ETH'           # Criptos
-    }
-
-    # Si monthly no está especificado, se detecta automáticamente
-    if monthly is None:
-        monthly = symbol in monthly_contracts
-
-    month_codes = {
-        1: 'F', 2: 'G', 3: 'H', 4: 'J', 5: 'K', 6: 'M',
-        7: 'N', 8: 'Q', 9: 'U', 10: 'V', 11: 'X', 12: 'Z'
-    }
-
-    if monthly:
-        next_month = current_date.month + 1
-        year = current_date.year
-        if next_month > 12:
-            next_month = 1
-            year += 1
-        code = month_codes[next_month]
-    else:
-        quarterly_months = [3, 6, 9, 12]
-        year = current_date.year
-        for m in quarterly_months:
-            # tercer viernes del mes
-            first_day = datetime.datetime(year, m, 1)
-            weekday = first_day.weekday()
-            delta = (4 - weekday + 7) % 7
-            third_friday = 1 + delta + 14
-            opex = datetime.datetime(year, m, third_friday)
-            if current_date < opex:
-                code = month_codes[m]
-                break
+def chunks(lst, n):
+    """Divide una lista en bloques de tamaño n."""
+    for i in range(0, len(lst), n):
+        yield lst[i:i + n]
+
+class OptionsRequest(TypedDict):
+    tickers: List[str]
+    start_date: datetime.date
+    end_date: datetime.date
+    lower_strike: str
+    upper_strike: str
+    # Only these strikes inside the window (e.g. the positions to close), not the whole range
+    strikes: NotRequired[List[str]]
+
+class CachedChain:
+    """An option chain plus an (expiration, strike, "C"|"P") -> contract index built once."""
+
+    def __init__(self, ticker: str, chain):
+        self.ticker = ticker
+        self.chain = chain
+        # (expiration_date, float strike) keys map to (strike text, option symbol, streamer symbol);
+        # insertion order follows the chain (expiration, strike, call before put)
+        self.index = {}
+        for expiration in self._expirations():
+            for strike in expiration.strikes:
+                strike_price = float(str(strike.strike_price))
+                if strike.call:
+                    self.index[(expiration.expiration_date, strike_price, "C")] = (
+                        str(strike.strike_price), strike.call, strike.call_streamer_symbol)
+                if strike.put:
+                    self.index[(expiration.expiration_date, strike_price, "P")] = (
+                        str(strike.strike_price), strike.put, strike.put_streamer_symbol)
+
+    def _expirations(self):
+        if '/' in self.ticker:
+            for subchain in self.chain.option_chains:
+                yield from subchain.expirations  # <- NestedFutureOptionChainExpiration
         else:
-            year += 1
-            code = month_codes[3]  # marzo siguiente año
+            for chain in self.chain:
+                yield from chain.expirations
 
-    year_code = str(year)[-1]
-    symbol = '/' + symbol
-    return f"{symbol}{code}{year_code}"
+    def lookup(self, expiration: datetime.date, strike: float, option_type: str):
+        """Return (strike text, option symbol, streamer symbol) or None."""
+        return self.index.get((expiration, float(strike), option_type.upper()))
 
 
-def extract_base_symbol(future_ticker: str) -> str:
+class OptionChainCache:
     """
-    Extrae el símbolo base desde un ticker de futuros (e.g., '/ESU5' → '/ES').
-
-    Detecta automáticamente el símbolo base eliminando el código de mes y año.
+    Option chains by underlying, kept `ttl` seconds and evicted LRU-style past `maxsize`.
+    SPX/NDX chains barely change intraday, and downloading them dominates an order command.
     """
-    # Tabla de códigos de mes de futuros
-    month_codes = {'F', 'G', 'H', 'J', 'K', 'M', 'N', 'Q', 'U', 'V', 'X', 'Z'}
 
-    ticker = future_ticker.strip().upper()
+    def __init__(self, maxsize: int = 32, ttl: int = 30 * 60):
+        self._chains = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
 
-    # Buscar código de mes y año en las últimas posiciones
-    if len(ticker) < 3:
-        raise ValueError(f"Ticker demasiado corto: {ticker}")
+    async def get(self, session, ticker: str) -> CachedChain:
+        cached = self._chains.get(ticker)
+        if cached is not None:
+            self.hits += 1
+            return cached
 
-    # Recorrer desde el final hacia atrás para detectar patrón válido
-    for i in range(len(ticker) - 2, 0, -1):
-        if ticker[i] in month_codes and ticker[i+1].isdigit():
-            return ticker[:i]  # Devuelve todo lo anterior al mes
+        self.misses += 1
+        # Concurrent misses on a cold ticker share one download (see coalesced)
+        return await coalesced(("chain", ticker), lambda: self._fetch(session, ticker))
 
-    raise ValueError(f"No se pudo extraer símbolo base de: {ticker}")
+    async def _fetch(self, session, ticker: str) -> CachedChain:
+        if '/' in ticker:
+            chain = NestedFutureOptionChain.get(session, ticker)
+        else:
+            chain = NestedOptionChain.get(session, ticker)
+        if inspect.isawaitable(chain):  # NestedFutureOptionChain.get is sync in older SDKs
+            chain = await chain
 
+        cached = CachedChain(ticker, chain)
+        self._chains[ticker] = cached
+        return cached
 
+    def invalidate(self, ticker: str = None):
+        if ticker is None:
+            self._chains.clear()
+        else:
+            self._chains.pop(ticker, None)
 
-def chunks(lst, n):
-    """Divide una lista en bloques de tamaño n."""
-    for i in range(0, len(lst), n):
-        yield lst[i:i + n]
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+            "size": len(self._chains),
+        }
 
-class OptionsRequest(TypedDict):
-    tickers: List[str]
-    start_date: datetime.date
-    end_date: datetime.date
-    lower_strike: str
-    upper_strike: str
 
-async def get_chain_async(session, ticker):
-    if '/' in ticker:
-        return NestedFutureOptionChain.get(session, ticker)
+chain_cache = OptionChainCache()
 
-    return await NestedOptionChain.get(session, ticker)
+async def get_chain_async(session, ticker) -> CachedChain:
+    return await chain_cache.get(session, ticker)
 
 async def get_market_data_async(session, equities=None, options=None):
     return await get_market_data_by_type(session, equities=equities, options=options)
@@ -128,29 +127,17 @@ async def tasty_expirations_strikes(session, options_ticker : list[str]):
     strikes_chain = defaultdict(set)
     strikes_list = []
     chains_list = await asyncio.gather(*[get_chain_async(session, t) for t in options_ticker])
-    # Flatten lista de listas
-    for i in options_ticker:
-        if '/' in i:
-            for chain in chains_list:
-                for subchain in chain.option_chains:
-                    for expiration in subchain.expirations:  # <- NestedFutureOptionChainExpiration
-                        for strike in expiration.strikes:
-                            ticker = str(strike.call).split()[0]
-                            if get_future_ticker(i) in ticker:
-                                expiries_chain[i].add(expiration.expiration_date)
-                                strikes_chain[ticker].add(float(strike.strike_price))
-
-        else:                            
-            chains = [item for sublist in chains_list for item in sublist]
-
-            
-            for chain in chains:
-                for expiration in chain.expirations:
-                    for strike in expiration.strikes:
-                        ticker = str(strike.call).split()[0]
-                        expiries_chain[ticker].add(expiration.expiration_date)
-                        strikes_chain[ticker].add(float(strike.strike_price))
-                        
+    for i, chain in zip(options_ticker, chains_list):
+        future_ticker = get_future_ticker(i) if '/' in i else None
+        for (exp_date, strike_price, _), (_, option, _) in chain.index.items():
+            ticker = str(option).split()[0]
+            if future_ticker is not None:
+                if future_ticker in ticker:
+                    expiries_chain[i].add(exp_date)
+                    strikes_chain[ticker].add(strike_price)
+            else:
+                expiries_chain[ticker].add(exp_date)
+                strikes_chain[ticker].add(strike_price)
 
     for ticker, dates in expiries_chain.items():
         dates_list = sorted(dates)
@@ -175,55 +162,274 @@ async def tasty_expirations_strikes(session, options_ticker : list[str]):
     return expiries_list, strikes_list
 
 
-async def collect_events(streamer, event_type, symbols, greeks_list, symbol_pairs, timeout=2):
-    await streamer.subscribe(event_type, symbols)
+# Seconds each event type may take to deliver every subscribed symbol
+EVENT_DEADLINES = {Greeks: 2.0, Summary: 2.0}
+# Cap on the total time one download waits for streamer events, across all event types
+MAX_EVENT_WAIT = 3.0
+
+# Per event type: runs, runs completed before the deadline, seconds waited, symbols missed
+collector_metrics = defaultdict(lambda: {"runs": 0, "completed": 0, "seconds": 0.0, "missing": 0, "last": None})
+
+
+def get_collector_metrics():
+    """Snapshot of collect_events metrics, with the average time to complete per event type."""
+    snapshot = {}
+    for event_type, m in collector_metrics.items():
+        snapshot[event_type.__name__] = dict(m, avg_seconds=m["seconds"] / m["runs"] if m["runs"] else None)
+    return snapshot
+
+
+async def collect_events(subscription, event_type, symbols, surface, timeout=None, deadline=None):
+    """
+    Route `event_type` events from a streamer subscription until every symbol reported.
+
+    Stops early once nothing is pending; otherwise after `timeout` seconds (default
+    EVENT_DEADLINES[event_type]) or at `deadline` (absolute loop time), whichever is first.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    pending = set(symbols)
     received = set()
-    end_time = asyncio.get_event_loop().time() + timeout
+    if not pending:
+        return received
+
+    if timeout is None:
+        timeout = EVENT_DEADLINES.get(event_type, 2.0)
+    end_time = started + timeout
+    if deadline is not None:
+        end_time = min(end_time, deadline)
 
-    while True:
-        remaining = end_time - asyncio.get_event_loop().time()
+    while pending:
+        remaining = end_time - loop.time()
         if remaining <= 0:
             break
         try:
-            event = await asyncio.wait_for(streamer.get_event(event_type), timeout=2)
-            received.add(event.event_symbol)
-
-            # Procesar evento: actualizar greeks_list según event_type
-            for _, tasty_symbol in symbol_pairs:
-                if event.event_symbol == tasty_symbol:
-                    for idx, d in enumerate(greeks_list):
-                        if d.get("symbol") == tasty_symbol:
-                            if event_type == Greeks:
-                                d.update({
-                                    "delta": str(event.delta),
-                                    "gamma": str(event.gamma),
-                                    "theta": str(event.theta),
-                                    "vega": str(event.vega),
-                                    "rho": str(event.rho),
-                                    "vol": str(event.volatility),
-                                    "price": str(event.price)
-                                })
-                            elif event_type == Summary:
-                                d.update({
-                                    "open_interest": str(event.open_interest),
-                                })
-            
-                            break
-                    break
-
+            event = await asyncio.wait_for(subscription.get_event(), timeout=remaining)
         except asyncio.TimeoutError:
-            # Timeout para un solo get_event: solo continuar para terminar si timeout global excedido
-            continue
-
-    missing = [s for s in symbols if s not in received]
-    if missing:
-        print(f"Timeout loading {event_type.__name__} events for symbols (not received)")
+            break
+        received.add(event.event_symbol)
+        pending.discard(event.event_symbol)
+        surface.apply_event(event_type, event)
+
+    elapsed = loop.time() - started
+    metrics = collector_metrics[event_type]
+    metrics["runs"] += 1
+    metrics["seconds"] += elapsed
+    metrics["missing"] += len(pending)
+    metrics["completed"] += not pending
+    metrics["last"] = {"seconds": elapsed, "symbols": len(symbols), "missing": len(pending)}
+    if pending:
+        print(f"Timeout loading {event_type.__name__} events for {len(pending)}/{len(symbols)} symbols (not received)")
 
     return received
 
 
+# Unused symbols stay subscribed this long, so back-to-back commands reuse them
+IDLE_GRACE = 60.0
+# Seconds a subscription waits for the shared streamer to (re)connect
+CONNECT_TIMEOUT = 10.0
+# Symbols per subscribe message on (re)connect
+SUBSCRIBE_CHUNK = 500
+
+
+class StreamSubscription:
+    """One consumer's view of the shared streamer: events for its symbols only."""
 
-async def main_downloader(session, options_requested : OptionsRequest = None, equities_ticker : List[str] = []) -> Tuple[List, List]:
+    def __init__(self, event_type, symbols):
+        self.event_type = event_type
+        self.symbols = list(symbols)
+        self.queue = asyncio.Queue()
+
+    async def get_event(self):
+        return await self.queue.get()
+
+
+class StreamerManager:
+    """
+    A single long-lived DXLinkStreamer shared by every download.
+
+    Subscriptions are reference-counted per (event type, symbol): only symbols nobody has
+    requested yet are subscribed, and a symbol is unsubscribed once it has been unused for
+    IDLE_GRACE seconds. Each event type has one reader task that fans events out to the
+    subscribers of that symbol, and the last event per symbol is replayed to new subscribers
+    (DXLink only sends the snapshot once). If the connection drops it reconnects and
+    resubscribes everything still tracked. Subscribe and unsubscribe calls go through one
+    lock, so an idle unsubscribe can never land after a new subscription of the same symbol.
+    """
+
+    def __init__(self, event_types=(Greeks, Summary), idle_grace: float = IDLE_GRACE):
+        self.event_types = tuple(event_types)
+        self.idle_grace = idle_grace
+        self._session = None
+        self._task = None
+        self._streamer = None
+        self._connected = asyncio.Event()
+        self._lock = asyncio.Lock()  # serializes (un)subscribe calls against the bookkeeping
+        self._refcounts = defaultdict(int)
+        self._listeners = defaultdict(set)
+        self._subscribed = set()
+        self._live = set()  # keys already sent on the current connection
+        self._idle_since = {}
+        self._last_events = {}
+        self.reconnects = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, session):
+        """Start the shared streamer (no-op if it is already running)."""
+        if self.running:
+            return
+        self._session = session
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._streamer = None
+        self._connected.clear()
+        self._refcounts.clear()
+        self._listeners.clear()
+        self._subscribed.clear()
+        self._live.clear()
+        self._idle_since.clear()
+        self._last_events.clear()
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                async with DXLinkStreamer(self._session) as streamer:
+                    await self._resubscribe(streamer)
+                    self._streamer = streamer
+                    self._connected.set()
+                    backoff = 1.0
+                    await asyncio.gather(
+                        *(self._read(streamer, event_type) for event_type in self.event_types),
+                        self._expire_idle(streamer)
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[!] DXLink streamer desconectado: {e!r}; reconectando en {backoff:.0f}s")
+            finally:
+                self._connected.clear()
+                self._streamer = None
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def _resubscribe(self, streamer):
+        self._live = set(self._subscribed)
+        by_type = defaultdict(list)
+        for event_type, symbol in self._live:
+            by_type[event_type].append(symbol)
+        for event_type, symbols in by_type.items():
+            for batch in chunks(symbols, SUBSCRIBE_CHUNK):
+                await streamer.subscribe(event_type, batch)
+
+    async def _read(self, streamer, event_type):
+        while True:
+            event = await streamer.get_event(event_type)
+            key = (event_type, event.event_symbol)
+            self._last_events[key] = event
+            for sub in self._listeners.get(key, ()):
+                sub.queue.put_nowait(event)
+
+    async def _expire_idle(self, streamer):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.idle_grace / 2)
+            # Con el lock, un _acquire que llegue durante el unsubscribe espera a que termine
+            # y vuelve a suscribir el símbolo en lugar de perderlo
+            async with self._lock:
+                cutoff = loop.time() - self.idle_grace
+                expired = defaultdict(list)
+                for key, since in list(self._idle_since.items()):
+                    if since <= cutoff:
+                        expired[key[0]].append(key[1])
+                        del self._idle_since[key]
+                        self._subscribed.discard(key)
+                        self._live.discard(key)
+                        self._last_events.pop(key, None)
+                        self._listeners.pop(key, None)
+                for event_type, symbols in expired.items():
+                    await streamer.unsubscribe(event_type, symbols)
+
+    async def _acquire(self, sub):
+        new_symbols = []
+        for symbol in sub.symbols:
+            key = (sub.event_type, symbol)
+            self._refcounts[key] += 1
+            self._listeners[key].add(sub)
+            self._idle_since.pop(key, None)
+            if key in self._subscribed:
+                last = self._last_events.get(key)
+                if last is not None:
+                    sub.queue.put_nowait(last)
+            else:
+                self._subscribed.add(key)
+                new_symbols.append(symbol)
+
+        if not new_symbols:
+            return
+        await asyncio.wait_for(self._connected.wait(), timeout=CONNECT_TIMEOUT)
+        async with self._lock:
+            # Una (re)conexión mientras esperábamos ya pudo haberlos suscrito
+            new_symbols = [s for s in new_symbols if (sub.event_type, s) not in self._live]
+            if not new_symbols or self._streamer is None:
+                # Sin conexión siguen en _subscribed: la reconexión los suscribe
+                return
+            self._live.update((sub.event_type, s) for s in new_symbols)
+            try:
+                await self._streamer.subscribe(sub.event_type, new_symbols)
+            except Exception as e:
+                # Siguen en _subscribed: la reconexión los vuelve a suscribir
+                print(f"[!] Error suscribiendo {len(new_symbols)} símbolos a {sub.event_type.__name__}: {e!r}")
+
+    def _release(self, sub):
+        now = asyncio.get_running_loop().time()
+        for symbol in sub.symbols:
+            key = (sub.event_type, symbol)
+            self._listeners[key].discard(sub)
+            self._refcounts[key] -= 1
+            if self._refcounts[key] <= 0:
+                del self._refcounts[key]
+                self._idle_since[key] = now
+
+    @asynccontextmanager
+    async def subscription(self, event_type, symbols):
+        """`async with streamer_manager.subscription(Greeks, symbols) as sub: await sub.get_event()`"""
+        if not self.running:
+            raise RuntimeError("StreamerManager no iniciado: llamar a start(session) primero")
+        sub = StreamSubscription(event_type, symbols)
+        try:
+            await self._acquire(sub)
+            yield sub
+        finally:
+            self._release(sub)
+
+    def stats(self) -> dict:
+        return {
+            "connected": self._connected.is_set(),
+            "reconnects": self.reconnects,
+            "subscribed": len(self._subscribed),
+            "in_use": len(self._refcounts),
+            "idle": len(self._idle_since),
+        }
+
+
+streamer_manager = StreamerManager(event_types=(Greeks, Summary, Quote, Trade))
+
+
+async def main_downloader(session, options_requested : OptionsRequest = None, equities_ticker : List[str] = [], as_surface : bool = False) -> Tuple[List, List]:
+    """Spot quotes plus option quotes/Greeks; options come as an OptionSurface if `as_surface`."""
 
     if (not isinstance(options_requested, dict)) and options_requested != None:
         raise TypeError("""Parameter 'options_requested' must be a dict (TypedDict) with the following string keys : value 
@@ -260,10 +466,8 @@ async def main_downloader(session, options_requested : OptionsRequest = None, eq
         })
 
     
-    greeks_list = []
-
     if options_requested is None:
-        return greeks_list[::-1], equities_spot[::-1]
+        return (OptionSurface.empty() if as_surface else []), equities_spot[::-1]
 
     options_ticker = options_requested.get("tickers", [])
     
@@ -275,236 +479,345 @@ async def main_downloader(session, options_requested : OptionsRequest = None, eq
 
     lower_strike = options_requested.get("lower_strike", "0")
     upper_strike = options_requested.get("upper_strike", "0")
+    strikes = options_requested.get("strikes")
 
     for i in options_ticker:
         if "/" in i:
             options_ticker = [extract_base_symbol(i)]
     
-    # Obtener todas las cadenas de opciones
+    # Obtener todas las cadenas de opciones (cacheadas, con índice por contrato)
     chains_list = await asyncio.gather(*[get_chain_async(session, t) for t in options_ticker])
 
-    # Flatten lista de listas
-    symbol_pairs = []
-    for i in options_ticker:
-        if '/' in i:
-            for chain in chains_list:
-                for subchain in chain.option_chains:
-                    for expiration in subchain.expirations:  # <- NestedFutureOptionChainExpiration
-                        exp_date = expiration.expiration_date
-                        if not (start_date <= exp_date <= end_date):
-                            continue
-                        
-                        for strike in expiration.strikes:
-                            strike_price = float(str(strike.strike_price))
-
-                            if float(lower_strike) <= strike_price <= float(upper_strike):
-                                if strike.call:
-                                    call_entry = {
-                                    "expiration": exp_date,
-                                    "strike": str(strike.strike_price),
-                                    "option": str(strike.call),
-                                    "symbol": str(strike.call_streamer_symbol)
-                                    }
-
-                                    if call_entry not in greeks_list:
-                                        symbol_pairs.append((strike.call, strike.call_streamer_symbol))
-                                        greeks_list.append(call_entry)
-
-                                if strike.put:
-                                    put_entry = {
-                                        "expiration": exp_date,
-                                        "strike": str(strike.strike_price),
-                                        "option": str(strike.put),
-                                        "symbol": str(strike.put_streamer_symbol)
-                                    }
-
-                                    if put_entry not in greeks_list:
-                                        symbol_pairs.append((strike.put, strike.put_streamer_symbol))
-                                        greeks_list.append(put_entry)
-            
-
-        else:                            
-            chains = [item for sublist in chains_list for item in sublist]
-            
-            for chain in chains:
-                for expiration in chain.expirations:
-                    exp_date = expiration.expiration_date
-                    if not (start_date <= exp_date <= end_date):
-                        continue
-
-                    for strike in expiration.strikes:
-                        strike_price = float(str(strike.strike_price))
-                        if float(lower_strike) <= strike_price <= float(upper_strike):
-                            if strike.call:
-                                call_entry = {
-                                "expiration": exp_date,
-                                "strike": str(strike.strike_price),
-                                "option": str(strike.call),
-                                "symbol": str(strike.call_streamer_symbol)
-                                }
-
-                                if call_entry not in greeks_list:
-                                    symbol_pairs.append((strike.call, strike.call_streamer_symbol))
-                                    greeks_list.append(call_entry)
-
-                            if strike.put:
-                                put_entry = {
-                                    "expiration": exp_date,
-                                    "strike": str(strike.strike_price),
-                                    "option": str(strike.put),
-                                    "symbol": str(strike.put_streamer_symbol)
-                                }
-
-                                if put_entry not in greeks_list:
-                                    symbol_pairs.append((strike.put, strike.put_streamer_symbol))
-                                    greeks_list.append(put_entry)
-                      
-    # Hacer requests en batches de 100
-    async def get_data_batch(batch):
-        symbols = [s[0] for s in batch]
-        return await get_market_data_async(session, options=symbols), batch
+    surface = OptionSurface.from_chains(chains_list, start_date, end_date, lower_strike, upper_strike, strikes)
 
-    batch_tasks = [get_data_batch(batch) for batch in chunks(symbol_pairs, 100)]
+    # Hacer requests en batches de 100
+    batch_tasks = [get_market_data_async(session, options=list(batch)) for batch in chunks(surface.option, 100)]
     batch_results = await asyncio.gather(*batch_tasks)
 
     # Procesar resultados batch
-    processed = set()
-    for data, batch in batch_results:
-        for i in data:
-            for symbol, tasty_symbol in batch:
-                #print("Symbol:",symbol, "Tasty symbol", tasty_symbol, "i symbol", i.symbol)
-                if i.symbol == symbol:
-                    if tasty_symbol in processed:
-                        break
-                    for idx, d in enumerate(greeks_list):
-                        if d.get("symbol") == str(tasty_symbol):
-                            #print("d.get:", d.get("symbol"), " tasy symbol: ", str(tasty_symbol))
-
-                            ticker = str(symbol).split()[0]
-                            greeks_list[idx].update({
-                                "ticker": ticker,
-                                "ask": str(i.ask),
-                                "ask_size": str(i.ask_size),
-                                "bid": str(i.bid),
-                                "bid_size": str(i.bid_size),
-                                "mid": str(i.mid),
-                                "last": str(i.last),
-                                "time": i.updated_at.astimezone(ZoneInfo("America/New_York")).strftime("%Y-%m-%d %H:%M:%S")
-                            })
-                            #print(greeks_list[idx])
-
-                            processed.add(tasty_symbol)
-                            break
-        
-
-        # Podrías guardar la info de market data aquí si la necesitas
-
-    # Obtener griegas con DXLink
-    async with DXLinkStreamer(session) as streamer:
-        tasty_symbols = [t for (_, t) in symbol_pairs]
-        
+    for data in batch_results:
+        surface.apply_market_data(data)
+
+    # Obtener griegas con el DXLink compartido
+    await streamer_manager.start(session)
+    tasty_symbols = list(surface.symbol)
+    async with streamer_manager.subscription(Greeks, tasty_symbols) as greeks_sub, \
+            streamer_manager.subscription(Summary, tasty_symbols) as summary_sub:
+        deadline = asyncio.get_running_loop().time() + MAX_EVENT_WAIT
         await asyncio.gather(
-        collect_events(streamer, Greeks, tasty_symbols, greeks_list, symbol_pairs, timeout=2),
-        collect_events(streamer, Summary, tasty_symbols, greeks_list, symbol_pairs, timeout=2)
+        collect_events(greeks_sub, Greeks, tasty_symbols, surface, deadline=deadline),
+        collect_events(summary_sub, Summary, tasty_symbols, surface, deadline=deadline)
         )
 
-    return greeks_list[::-1], equities_spot[::-1]
-
-async def run_batched_main(
-    session,
-    options_requested,
-    date_chunk_size=100,  # días
-    strike_step=100       # puntos
-):
-    end_date = options_requested["end_date"]
-    start_date = options_requested["start_date"]
-    delta_days = (end_date - start_date).days
-    date_ranges = [
-        (
-            start_date + datetime.timedelta(days=i),
-            min(start_date + datetime.timedelta(days=i + date_chunk_size), end_date)
-        )
-        for i in range(0, delta_days + 1, date_chunk_size)
-    ]
-
-    # Generar todos los pares de strikes
-    strike_ranges = []
-    lower_strike = float(options_requested["lower_strike"])
-    upper_strike = float(options_requested["upper_strike"])
-    strike = lower_strike
-    while strike < upper_strike:
-        next_strike = min(strike + strike_step, upper_strike)
-        strike_ranges.append((strike, next_strike))
-        strike = next_strike
-
-    greeks_list_total = []
-
-    # Para cada combinación fecha/strike, ejecutar llamadas a main
-    for d_start, d_end in date_ranges:
-        tasks = []
-        for s_low, s_high in strike_ranges:
-            for ticker_ in options_requested["tickers"]:
-                if '/' in ticker_:
-                    options_requested["tickers"] = [get_future_ticker(ticker_)]
-            options_requested = {
-                "tickers": options_requested["tickers"],
-                "start_date": d_start,
-                "end_date": d_end,
-                "lower_strike": str(s_low),
-                "upper_strike": str(s_high),
-            }
-            tasks.append(main_downloader(session, options_requested=options_requested))
+    if as_surface:
+        return surface, equities_spot[::-1]
+    return surface.to_records()[::-1], equities_spot[::-1]
 
-        # Ejecutar en paralelo
-        try:
 
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            for result in results:
-                if isinstance(result, Exception):
-                    print(f"[!] Error en una tarea: {result}")
-                else:
-                    greeks_chunk, _ = result
-                    greeks_list_total.extend(greeks_chunk)
-        except:
-            continue
+# A streamed quote older than this is treated as a miss and re-read over REST
+MAX_QUOTE_AGE = 15.0
+# Symbols not requested for this long stop being watched
+QUOTE_WATCH_TTL = 30 * 60.0
 
-    return greeks_list_total
 
+class QuoteCache:
+    """
+    Last bid/ask/trade per equity or future, kept current by streaming Quote/Trade events.
 
-async def tasty_data(session, options_requested : OptionsRequest = None, equities_ticker : List[str] = []) -> Tuple[List, List]:
-    
-    greeks_list, equities_spot = await main_downloader(session, equities_ticker = equities_ticker)
+    `get` returns a dict shaped like the `equities_spot` items of main_downloader. A symbol is
+    watched (subscribed on the shared streamer) from its first request until it goes
+    QUOTE_WATCH_TTL seconds unused; misses and stale entries fall back to REST.
+    """
 
-    if options_requested == None:
-        return greeks_list, equities_spot        
+    def __init__(self, max_age: float = MAX_QUOTE_AGE, watch_ttl: float = QUOTE_WATCH_TTL):
+        self.max_age = max_age
+        self.watch_ttl = watch_ttl
+        self._quotes = {}          # symbol -> quote dict
+        self._updated = {}         # symbol -> time.monotonic() of the last update
+        self._last_used = {}       # symbol -> time.monotonic() of the last get
+        self._watches = {}         # symbol -> task feeding the cache
+        self._streamer_symbols = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    async def _streamer_symbol(self, session, symbol: str) -> str:
+        streamer_symbol = self._streamer_symbols.get(symbol)
+        if streamer_symbol is None:
+            if symbol.startswith('/'):
+                future = await Future.get(session, symbol)  # /ESZ5 -> /ESZ25:XCME
+                streamer_symbol = future.streamer_symbol
+            else:
+                streamer_symbol = symbol
+            self._streamer_symbols[symbol] = streamer_symbol
+        return streamer_symbol
+
+    def _update(self, symbol: str, **fields):
+        quote = self._quotes.setdefault(symbol, {"symbol": symbol})
+        quote.update(fields)
+        quote["time"] = datetime.datetime.now(ZoneInfo("America/New_York")).strftime("%Y-%m-%d %H:%M:%S")
+        self._updated[symbol] = time.monotonic()
+
+    def _apply(self, symbol: str, event):
+        if isinstance(event, Quote):
+            bid, ask = event.bid_price, event.ask_price
+            mid = (bid + ask) / 2 if bid is not None and ask is not None else None
+            self._update(symbol, bid=str(bid), ask=str(ask), bid_size=str(event.bid_size),
+                         ask_size=str(event.ask_size), mid=str(mid))
+        elif isinstance(event, Trade):
+            self._update(symbol, last=str(event.price))
+
+    async def _watch(self, session, symbol: str):
+        try:
+            streamer_symbol = await self._streamer_symbol(session, symbol)
+            async with streamer_manager.subscription(Quote, [streamer_symbol]) as quotes, \
+                    streamer_manager.subscription(Trade, [streamer_symbol]) as trades:
+                pending = {asyncio.ensure_future(quotes.get_event()): quotes,
+                           asyncio.ensure_future(trades.get_event()): trades}
+                try:
+                    while time.monotonic() - self._last_used.get(symbol, 0) < self.watch_ttl:
+                        done, _ = await asyncio.wait(pending, timeout=60, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            sub = pending.pop(task)
+                            self._apply(symbol, task.result())
+                            pending[asyncio.ensure_future(sub.get_event())] = sub
+                finally:
+                    for task in pending:
+                        task.cancel()
+        except Exception as e:
+            print(f"[!] Quote stream de {symbol} detenido: {e!r}")
+        finally:
+            self._watches.pop(symbol, None)
+            self._updated.pop(symbol, None)
+
+    def watch(self, session, symbol: str):
+        """Keep `symbol` streaming into the cache (no-op if already watched)."""
+        self._last_used[symbol] = time.monotonic()
+        if symbol not in self._watches and streamer_manager.running:
+            self._watches[symbol] = asyncio.create_task(self._watch(session, symbol))
+
+    def peek(self, symbol: str):
+        """The cached quote if it is fresh, else None."""
+        updated = self._updated.get(symbol)
+        if updated is None or not streamer_manager.stats()["connected"]:
+            return None
+        if time.monotonic() - updated > self.max_age:
+            return None
+        return self._quotes.get(symbol)
+
+    async def get(self, session, symbol: str):
+        """Quote for `symbol` from the stream, or over REST on a miss/stale entry. None if unknown."""
+        await streamer_manager.start(session)
+        self.watch(session, symbol)
+
+        quote = self.peek(symbol)
+        if quote is not None:
+            self.hits += 1
+            return dict(quote)
+
+        if symbol in self._quotes:
+            self.stale += 1
+        else:
+            self.misses += 1
+        _, spot = await main_downloader(session, equities_ticker=[symbol])
+        match = next((item for item in spot if item["symbol"] == symbol), None)
+        if match is not None:
+            # Sembrar la caché: el stream solo manda cambios
+            self._quotes[symbol] = dict(match)
+            self._updated[symbol] = time.monotonic()
+        return match
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses + self.stale
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / total if total else None,
+            "watched": len(self._watches),
+        }
+
+
+quote_cache = QuoteCache()
+
+
+# Contracts per work unit (REST batches of 100 + one streamer subscription)
+MAX_UNIT_SYMBOLS = 500
+# Units downloading at once; each runs ~MAX_UNIT_SYMBOLS/100 REST calls concurrently
+MAX_CONCURRENT_UNITS = 4
+# Extra attempts for a failed unit, with exponential backoff from UNIT_RETRY_BACKOFF seconds
+UNIT_RETRIES = 2
+UNIT_RETRY_BACKOFF = 0.5
+
+# Per-unit timing of the last run_batched_main call
+last_batch_report = []
+
+
+def plan_batches(chains_list, start_date, end_date, lower_strike, upper_strike, max_symbols=MAX_UNIT_SYMBOLS, strikes=None):
+    """
+    Split a date/strike window into (start, end, lower, upper) units of at most `max_symbols`
+    contracts (only `strikes`, if given). Consecutive expirations are merged while they fit;
+    an expiration that alone exceeds the limit is split by strike.
+    """
+    lower, upper = float(lower_strike), float(upper_strike)
+    wanted = None if strikes is None else {float(s) for s in strikes}
+    per_expiration = defaultdict(lambda: defaultdict(int))
+    for chain in chains_list:
+        for (exp_date, strike_price, _) in chain.index:
+            if start_date <= exp_date <= end_date and lower <= strike_price <= upper:
+                if wanted is None or strike_price in wanted:
+                    per_expiration[exp_date][strike_price] += 1
+
+    units = []
+    run_start = run_end = None
+    run_size = 0
+    for exp_date in sorted(per_expiration):
+        strikes = per_expiration[exp_date]
+        size = sum(strikes.values())
+        if run_start is not None and run_size + size > max_symbols:
+            units.append((run_start, run_end, lower, upper))
+            run_start = None
+        if size <= max_symbols:
+            if run_start is None:
+                run_start, run_size = exp_date, 0
+            run_end = exp_date
+            run_size += size
+            continue
 
-    
-    exp, _ = await tasty_expirations_strikes(session, options_requested["tickers"])
+        # Una sola expiración demasiado grande: cortar por strikes
+        chunk_low, chunk_size = None, 0
+        for strike_price in sorted(strikes):
+            if chunk_low is not None and chunk_size + strikes[strike_price] > max_symbols:
+                units.append((exp_date, exp_date, chunk_low, chunk_high))
+                chunk_low = None
+            if chunk_low is None:
+                chunk_low, chunk_size = strike_price, 0
+            chunk_high = strike_price
+            chunk_size += strikes[strike_price]
+        units.append((exp_date, exp_date, chunk_low, chunk_high))
 
-    size = sum(len(e[list(e.keys())[0]]["expirations"]) for e in exp)
-    size = round(size * (float(options_requested["upper_strike"]) - float(options_requested["lower_strike"])))
-    
-    try:
-        greeks_list = await (
-        run_batched_main(
-            session,
-            options_requested,
-            date_chunk_size=size,
-            strike_step=size
-        )
-    )
-    except:
-        greeks_list = await (
-        run_batched_main(
-            session,
-            options_requested,
-            date_chunk_size=size,
-            strike_step=size
-        )
+    if run_start is not None:
+        units.append((run_start, run_end, lower, upper))
+    return units
+
+
+async def run_batched_main(session, options_requested, max_symbols=MAX_UNIT_SYMBOLS, concurrency=MAX_CONCURRENT_UNITS):
+    """
+    Download a large window as bounded units run concurrently under a semaphore, merged into
+    one OptionSurface. Failed units are retried with backoff; per-unit timing is left in
+    `last_batch_report`.
+    """
+    tickers = [get_future_ticker(t) if '/' in t else t for t in options_requested["tickers"]]
+    # Mismas cadenas (cacheadas) que cargará main_downloader
+    chains_list = await asyncio.gather(*[get_chain_async(session, extract_base_symbol(t) if '/' in t else t)
+                                         for t in tickers])
+    strikes = options_requested.get("strikes")
+    units = plan_batches(chains_list, options_requested["start_date"], options_requested["end_date"],
+                         options_requested["lower_strike"], options_requested["upper_strike"], max_symbols, strikes)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    report = []
+
+    async def run_unit(unit):
+        d_start, d_end, s_low, s_high = unit
+        request = {
+            "tickers": tickers,
+            "start_date": d_start,
+            "end_date": d_end,
+            "lower_strike": str(s_low),
+            "upper_strike": str(s_high),
+        }
+        if strikes is not None:
+            request["strikes"] = strikes
+        started = time.perf_counter()
+        entry = {"unit": unit, "attempts": 0, "symbols": 0, "seconds": 0.0, "error": None}
+        report.append(entry)
+        for attempt in range(UNIT_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(UNIT_RETRY_BACKOFF * 2 ** (attempt - 1))
+            entry["attempts"] += 1
+            try:
+                async with semaphore:
+                    surface, _ = await main_downloader(session, options_requested=request, as_surface=True)
+                entry["symbols"] = len(surface)
+                entry["error"] = None
+                return surface
+            except Exception as e:
+                entry["error"] = repr(e)
+            finally:
+                entry["seconds"] = time.perf_counter() - started
+        print(f"[!] Error en unidad {d_start}..{d_end} {s_low}-{s_high} tras {entry['attempts']} intentos: {entry['error']}")
+        return OptionSurface.empty()
+
+    results = await asyncio.gather(*[run_unit(unit) for unit in units])
+    last_batch_report[:] = report
+    return OptionSurface.concat(results)
+
+
+# In-flight downloads by key (tasty_data requests, ("chain", ticker) for option chains):
+# concurrent identical requests share one
+_inflight = {}
+coalesce_stats = {"fetches": 0, "shared": 0}
+
+
+def _request_key(options_requested, equities_ticker):
+    equities = tuple(sorted(equities_ticker or ()))
+    if options_requested is None:
+        return (equities, None)
+    return (
+        equities,
+        tuple(sorted(options_requested.get("tickers", []))),
+        options_requested.get("start_date"),
+        options_requested.get("end_date"),
+        float(options_requested.get("lower_strike", 0)),
+        float(options_requested.get("upper_strike", 0)),
+        tuple(sorted({float(s) for s in options_requested["strikes"]})) if options_requested.get("strikes") is not None else None,
     )
-        
-    return greeks_list, equities_spot
 
 
+async def coalesced(key, factory):
+    """
+    Await `factory()` once per `key` at a time: callers arriving while it is in flight get
+    the same result (or exception). shield() keeps one caller's cancellation from
+    cancelling the fetch for the others.
+    """
+    future = _inflight.get(key)
+    if future is not None:
+        coalesce_stats["shared"] += 1
+        return await asyncio.shield(future)
+
+    coalesce_stats["fetches"] += 1
+    future = asyncio.ensure_future(factory())
+    _inflight[key] = future
 
+    def _done(f):
+        if _inflight.get(key) is f:
+            del _inflight[key]
+    future.add_done_callback(_done)
+    return await asyncio.shield(future)
+
+
+async def tasty_data(session, options_requested : OptionsRequest = None, equities_ticker : List[str] = [], as_surface : bool = False) -> Tuple[List, List]:
+    """
+    Spot quotes for `equities_ticker` and, if requested, the option window. Options come as
+    an OptionSurface with `as_surface`, otherwise as the legacy list of string dicts.
+    """
+    key = _request_key(options_requested, equities_ticker)
+    surface, equities_spot = await coalesced(
+        key, lambda: _tasty_data(session, dict(options_requested) if options_requested else None, equities_ticker))
+    # La superficie se comparte entre llamadas coalescidas: solo lectura.
+    # Los registros van en orden inverso, como los devolvía main_downloader
+    options = surface if as_surface else surface.to_records()[::-1]
+    return options, list(equities_spot)
+
+
+async def _tasty_data(session, options_requested : OptionsRequest = None, equities_ticker : List[str] = []) -> Tuple[OptionSurface, List]:
+    
+    surface, equities_spot = await main_downloader(session, equities_ticker = equities_ticker, as_surface=True)
+
+    if options_requested == None:
+        return surface, equities_spot
+
+    
+    surface = await run_batched_main(session, options_requested)
+    return surface, equities_spot
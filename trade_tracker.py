@@ -4,17 +4,17 @@ from discord.ext import commands, tasks
 from discord.ext.commands import CommandNotFound
 import datetime
 from zoneinfo import ZoneInfo
-from tastytrade import Session
-from tasty_handler import tasty_data
-from utils import get_future_ticker
-from db_handler import open_trade, close_trade, trim_trade, avg_down_trade, get_trade_stats, get_open_options_expiring_today, is_trade_open
+from db_async import open_trade, close_trade, close_trades, trim_trade, avg_down_trade, get_trade_stats, get_open_options_expiring_today
+import db_async
+from db_handler import parse_option_date, initialize_db, LEADERBOARD_MIN_DECIDED
 from dotenv import load_dotenv
 import os
 import math
 import asyncio
+from types import SimpleNamespace
 # Imports nuevos
 from trading_hours import validate_trading_hours
-from stats_calculator import TradeStats
+from stats_calculator import TradeStats, AggregateStats
 
 load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_BOT_TOKEN_2")
@@ -22,34 +22,42 @@ TASTYTRADE_USERNAME = os.getenv("TASTYTRADE_USERNAME")
 TASTYTRADE_PASSWORD = os.getenv("TASTYTRADE_PASSWORD")
 DISCORD_CHANNEL_ID = os.getenv("DISCORD_CHANNEL_ID")  # Optional: Channel ID for notifications
 
-session = Session(provider_secret=os.getenv('TASTYTRADE_CLIENT_SECRET'), refresh_token=os.getenv('TASTYTRADE_REFRESH_TOKEN'))
+# El SDK de Tastytrade arrastra pandas/exchange_calendars (~1s de import): se carga en un hilo
+# después de conectar a Discord, y los comandos que lo necesitan esperan a load_market()
+_market = None
+_market_lock = asyncio.Lock()
+
+
+def _load_market():
+    import tasty_handler
+    import utils
+    import futures_roll
+    from tastytrade import Session
+    session = Session(provider_secret=os.getenv('TASTYTRADE_CLIENT_SECRET'), refresh_token=os.getenv('TASTYTRADE_REFRESH_TOKEN'))
+    return SimpleNamespace(tasty=tasty_handler, utils=utils, rolls=futures_roll, session=session)
+
+
+async def load_market():
+    """tasty_handler, utils, futures_roll and the Tastytrade session, loaded on first use."""
+    global _market
+    if _market is None:
+        async with _market_lock:
+            if _market is None:
+                _market = await asyncio.to_thread(_load_market)
+    return _market
+
+
+class TradeTrackerBot(commands.Bot):
+    async def close(self):
+        # Cerrar el streamer DXLink compartido (y su tarea de expiración) antes del loop;
+        # si el mercado nunca se cargó no hay nada que cerrar
+        if _market is not None:
+            await _market.tasty.streamer_manager.stop()
+        await super().close()
 
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='', intents=intents, case_insensitive=True)
-
-def parse_option_date(date_str):
-    """Parse option date string in multiple formats"""
-    # Intentar formatos estándar
-    for fmt in ["%m/%d/%y", "%m/%d/%Y", "%-m/%-d/%y", "%-m/%-d/%Y"]:
-        try:
-            return datetime.datetime.strptime(date_str, fmt).date()
-        except ValueError:
-            continue
-    
-    # Si ningún formato funciona, intentar parsing manual
-    try:
-        parts = date_str.split('/')
-        if len(parts) == 3:
-            month, day, year = int(parts[0]), int(parts[1]), int(parts[2])
-            # Agregar siglo si es necesario
-            if year < 100:
-                year = 2000 + year if year < 50 else 1900 + year
-            return datetime.date(year, month, day)
-    except:
-        pass
-    
-    raise ValueError(f"Cannot parse date: {date_str}")
+bot = TradeTrackerBot(command_prefix='', intents=intents, case_insensitive=True)
 
 def build_embed(ctx, symbol, price, market, direction_label, extra="", is_long=True, avg_entry_price=None, closing_price=None, trim='', avg=''):
     username = ctx.author.name if ctx else "System"
@@ -99,6 +107,34 @@ def build_embed(ctx, symbol, price, market, direction_label, extra="", is_long=T
     embed.set_footer(text=footer_text)
     return embed
 
+def is_type_option(symbol: str, type_option: str) -> bool:
+    i = len(symbol) - 1
+    while i >= 0 and (symbol[i].isdigit() or symbol[i] == "."):
+        i -= 1
+    suffix = symbol[i:].lower()
+    return type_option.lower() in suffix
+
+def root_rank(item, underlying: str) -> int:
+    """Sort key between option roots of one underlying listing the same contract.
+
+    The PM-settled weekly root (SPXW, NDXP, RUTW) comes first, then the AM-settled root
+    named like the underlying (SPX, NDX, RUT), then contracts that came back without a quote.
+    """
+    if "ticker" not in item:
+        return 2
+    return 1 if item["ticker"] == underlying else 0
+
+def format_pnl(avg_entry_price, closing_price, symbol, is_long=True):
+    """PnL text as shown in the order embeds: points for futures, percentage otherwise."""
+    if '/' in symbol:
+        change = closing_price - avg_entry_price if is_long else avg_entry_price - closing_price
+        return f"{change:+.2f}pts"
+    try:
+        change = (closing_price - avg_entry_price) / avg_entry_price * 100
+    except ZeroDivisionError:
+        return "N/A"
+    return f"{change if is_long else -change:+.2f}%"
+
 def get_order_direction(command):
     cmd = command.upper()
     if cmd == "BTO":
@@ -177,12 +213,12 @@ async def order_command(ctx, ticker: str, *args):
                 price = "m"
             
             if '/' in symbol:
-                symbol_tastytrade = get_future_ticker(symbol)
+                symbol_tastytrade = (await load_market()).utils.get_future_ticker(symbol)
             else:
                 symbol_tastytrade = symbol
 
-            _, spot_prices = await tasty_data(session, equities_ticker=[symbol_tastytrade])
-            match = next((item for item in spot_prices if item["symbol"] == symbol_tastytrade), None)
+            m = await load_market()
+            match = await m.tasty.quote_cache.get(m.session, symbol_tastytrade)
             if not match:
                 await ctx.send("Ticker not found.")
                 return
@@ -206,20 +242,14 @@ async def order_command(ctx, ticker: str, *args):
                 type = "L" if ctx.invoked_with.upper() == "BTO" else "S"
                 user_name = ctx.author.name
                 if is_avg:
-                    if not is_trade_open(user_name, symbol, None, None, type):
-                        await ctx.send(f"Trade {symbol} must be open to average down.")
-                        return
-                    result = avg_down_trade(user_name, symbol, float(price), avg_qty, None, None, type)
+                    result = await avg_down_trade(user_name, symbol, float(price), avg_qty, None, None, type)
                     if result is None:
-                        await ctx.send(f"Trade {symbol} is not open")
-                        return
-                    if result is False:
-                        await ctx.send(f"Cannot average down {symbol} more than 2 times.")
+                        await ctx.send(f"Trade {symbol} must be open to average down.")
                         return
                     avg_entry_price, _ = result
                     closing_price = None  # No closing price for AVG
                 else:
-                    result = open_trade(user_name, symbol, float(price), 1, None, None, type)
+                    result = await open_trade(user_name, symbol, float(price), 1, None, None, type)
                     if result is None:
                         await ctx.send(f"Trade {symbol} is already opened")
                         return
@@ -231,17 +261,14 @@ async def order_command(ctx, ticker: str, *args):
                     await ctx.send("AVG is not allowed for STC or BTC commands.")
                     return
                 if is_trim:
-                    result = trim_trade(user_name, symbol, float(price), None, None, type)
+                    result = await trim_trade(user_name, symbol, float(price), None, None, type)
                     if result is None:
                         await ctx.send(f"Trade {symbol} is not open")
                         return
-                    if result is False:
-                        await ctx.send(f"Cannot trim {symbol} more than 4 times. Please close the trade.")
-                        return
                     avg_entry_price, _ = result
                     closing_price = float(price)  # Use trim price as closing price for display
                 else:
-                    result = close_trade(user_name, symbol, float(price), None, None, type)
+                    result = await close_trade(user_name, symbol, float(price), None, None, type)
                     if result is None:
                         await ctx.send(f"Trade {symbol} is not open")
                         return
@@ -298,16 +325,13 @@ async def order_command(ctx, ticker: str, *args):
                 "upper_strike": str(strike + 1)
             }
 
-            data, _ = await tasty_data(session, options_requested=options_request)
+            m = await load_market()
+            data, _ = await m.tasty.tasty_data(m.session, options_requested=options_request)
 
-            def is_type_option(symbol: str, type_option: str) -> bool:
-                i = len(symbol) - 1
-                while i >= 0 and (symbol[i].isdigit() or symbol[i] == "."):
-                    i -= 1
-                suffix = symbol[i:].lower()
-                return type_option.lower() in suffix
-            
-            match = next((item for item in data if item["strike"] == options_request["lower_strike"] and is_type_option(item["symbol"], type_option) and item["ticker"] != "SPX"), None)
+            candidates = (item for item in data
+                          if item["strike"] == options_request["lower_strike"] and is_type_option(item["symbol"], type_option)
+                          and "ticker" in item)
+            match = min(candidates, key=lambda item: root_rank(item, symbol), default=None)
             if not match:
                 await ctx.send("Option not found.")
                 return
@@ -329,20 +353,14 @@ async def order_command(ctx, ticker: str, *args):
                     if type_option not in ["C", "P"]:
                         await ctx.send("AVG is only allowed for options (C or P).")
                         return
-                    if not is_trade_open(user_name, symbol, formatted_date, strike_with_type[:-1], type_option):
-                        await ctx.send(f"Trade {symbol} {date_str} {strike_with_type} must be open to average down.")
-                        return
-                    result = avg_down_trade(user_name, symbol, float(price), avg_qty, formatted_date, strike_with_type[:-1], type_option)
+                    result = await avg_down_trade(user_name, symbol, float(price), avg_qty, formatted_date, strike_with_type[:-1], type_option)
                     if result is None:
-                        await ctx.send(f"Trade {symbol} {date_str} {strike_with_type} is not open")
-                        return
-                    if result is False:
-                        await ctx.send(f"Cannot average down {symbol} {date_str} {strike_with_type} more than 2 times.")
+                        await ctx.send(f"Trade {symbol} {date_str} {strike_with_type} must be open to average down.")
                         return
                     avg_entry_price, _ = result
                     closing_price = None  # No closing price for AVG
                 else:
-                    result = open_trade(user_name, symbol, float(price), 1, formatted_date, strike_with_type[:-1], type_option)
+                    result = await open_trade(user_name, symbol, float(price), 1, formatted_date, strike_with_type[:-1], type_option)
                     if result is None:
                         await ctx.send(f"Trade {symbol} is already opened")
                         return
@@ -356,17 +374,14 @@ async def order_command(ctx, ticker: str, *args):
                     if type_option not in ["C", "P"]:
                         await ctx.send("Trim is only allowed for options (C or P).")
                         return
-                    result = trim_trade(user_name, symbol, float(price), formatted_date, strike_with_type[:-1], type_option)
+                    result = await trim_trade(user_name, symbol, float(price), formatted_date, strike_with_type[:-1], type_option)
                     if result is None:
                         await ctx.send(f"Trade {symbol} {date_str} {strike_with_type} is not open")
                         return
-                    if result is False:
-                        await ctx.send(f"Cannot trim {symbol} {date_str} {strike_with_type} more than 4 times. Please close the trade.")
-                        return
                     avg_entry_price, _ = result
                     closing_price = float(price)  # Use trim price as closing price for display
                 else:
-                    result = close_trade(user_name, symbol, float(price), formatted_date, strike_with_type[:-1], type_option)
+                    result = await close_trade(user_name, symbol, float(price), formatted_date, strike_with_type[:-1], type_option)
                     if result is None:
                         await ctx.send(f"Trade {symbol} {date_str} {strike_with_type} is not open")
                         return
@@ -445,8 +460,17 @@ async def stats_command(ctx, username: str = None, timeframe: str = "all", statu
         if username is None:
             username = ctx.author.name
         
+        # Discord has a 6000 character limit per message, so we limit to ~50 trades
+        max_trades_to_show = 50
+
+        # All-time stats come from the per-user aggregates; only the listed trades are read
+        aggregates = None
+        if timeframe == "all" and status == "all":
+            aggregates = await db_async.get_user_aggregates(username)
+
         # Get trades
-        trades = get_trade_stats(username, timeframe, status)
+        trades = await get_trade_stats(username, timeframe, status,
+                                       limit=max_trades_to_show if aggregates else None)
         if trades is None:
             embed = discord.Embed(
                 title="Invalid Parameters",
@@ -475,14 +499,12 @@ async def stats_command(ctx, username: str = None, timeframe: str = "all", statu
                 "type": trade["type"],
                 "price": trade["price"],
                 "qty": trade["qty"],
-                "avg_down1": trade["avg_down1"],
-                "avg_down1_qty": trade["avg_down1_qty"],
-                "avg_down2": trade["avg_down2"],
-                "avg_down2_qty": trade["avg_down2_qty"],
-                "trim1": trade["trim1"],
-                "trim2": trade["trim2"],
-                "trim3": trade["trim3"],
-                "trim4": trade["trim4"],
+                "entry_avg": trade["entry_avg"],
+                "entry_qty": trade["entry_qty"],
+                "exit_avg": trade["exit_avg"],
+                "exit_qty": trade["exit_qty"],
+                "avg_down_count": trade["avg_down_count"],
+                "trim_count": trade["trim_count"],
                 "closing_price": trade["closing_price"],
                 "opened": trade["opened"],
                 "timestamp": trade["timestamp"],
@@ -490,7 +512,12 @@ async def stats_command(ctx, username: str = None, timeframe: str = "all", statu
             })
         
         # Calculate improved statistics
-        stats_calc = TradeStats(trades_list)
+        if aggregates:
+            equity = await db_async.get_equity_stats(username)
+            stats_calc = AggregateStats(aggregates, equity)
+        else:
+            stats_calc = TradeStats(trades_list)
+        total_trades = stats_calc.get_basic_stats()["total_trades"]
         stats_report = stats_calc.format_comprehensive_report()
         
         # Create embed with statistics
@@ -506,23 +533,13 @@ async def stats_command(ctx, username: str = None, timeframe: str = "all", statu
         await ctx.send(embed=embed)
         
         # Show detailed trade list
-        # Discord has a 6000 character limit per message, so we limit to ~50 trades
-        max_trades_to_show = 50
-        
         if len(trades_list) > 0:
             trade_lines = []
             for i, trade in enumerate(trades_list[:max_trades_to_show], 1):
                 ticker = trade["ticker"]
                 
-                # Calculate average entry price
-                prices = [(trade["price"], trade["qty"])]
-                if trade["avg_down1"]:
-                    prices.append((trade["avg_down1"], trade["avg_down1_qty"]))
-                if trade["avg_down2"]:
-                    prices.append((trade["avg_down2"], trade["avg_down2_qty"]))
-                
-                total_qty = sum(q for _, q in prices)
-                avg_entry = sum(p * q for p, q in prices) / total_qty if total_qty > 0 else trade["price"]
+                # Average entry price (weighted over the entry fills)
+                avg_entry = trade["entry_avg"] if trade["entry_avg"] is not None else trade["price"]
                 
                 # Format ticker
                 if trade["date"]:
@@ -534,11 +551,8 @@ async def stats_command(ctx, username: str = None, timeframe: str = "all", statu
                 
                 # If closed, calculate PnL
                 if trade["opened"] == 0:
-                    exit_prices = [p for p in [trade["trim1"], trade["trim2"], 
-                                               trade["trim3"], trade["trim4"], 
-                                               trade["closing_price"]] if p is not None]
-                    if exit_prices:
-                        avg_exit = sum(exit_prices) / len(exit_prices)
+                    avg_exit = trade["exit_avg"] if trade["exit_avg"] is not None else trade["closing_price"]
+                    if avg_exit is not None:
                         is_long = trade["type"] in ["L", "C"]
                         
                         if '/' in ticker:
@@ -557,8 +571,8 @@ async def stats_command(ctx, username: str = None, timeframe: str = "all", statu
                 trade_lines.append(line)
             
             # Add truncation message if there are more trades
-            if len(trades_list) > max_trades_to_show:
-                trade_lines.append(f"\n*... and {len(trades_list) - max_trades_to_show} more trades*")
+            if total_trades > max_trades_to_show:
+                trade_lines.append(f"\n*... and {total_trades - max_trades_to_show} more trades*")
             
             if trade_lines:
                 # Split into multiple embeds if needed (Discord 6000 char limit)
@@ -599,11 +613,228 @@ async def stats_command(ctx, username: str = None, timeframe: str = "all", statu
         import traceback
         traceback.print_exc()
 
+@bot.command(name="rebuild_stats")
+@commands.has_permissions(administrator=True)
+async def rebuild_stats_command(ctx, username: str = None):
+    """
+    Recomputes the stored PnL and all-time stats aggregates from the raw trades (admins only).
+
+    Usage:
+        rebuild_stats [username]
+    """
+    recomputed = await db_async.rebuild_aggregates(username)
+    if recomputed is None:
+        await ctx.send("Error rebuilding stats, check the bot logs.")
+        return
+    scope = username or "all users"
+    await ctx.send(f"Stats rebuilt for {scope}: {recomputed} closed trades recomputed.")
+
+@rebuild_stats_command.error
+async def rebuild_stats_error(ctx, error):
+    if isinstance(error, commands.MissingPermissions):
+        await ctx.send("Only administrators can rebuild stats.")
+    else:
+        raise error
+
+@bot.command(name="equity")
+async def equity_command(ctx, username: str = None, timeframe: str = "all"):
+    """
+    Shows the equity curve of a user's closed trades: cumulative PnL, max drawdown,
+    losing streaks, profit factor and expectancy per instrument class.
+
+    Usage:
+        equity [username] [timeframe]
+
+    Examples:
+        equity
+        equity jinskukripta monthly
+    """
+    valid_timeframes = ["today", "weekly", "monthly", "yearly", "all"]
+    if timeframe not in valid_timeframes:
+        embed = discord.Embed(
+            title="Invalid Timeframe",
+            description=f"**You used:** `{timeframe}`\n**Valid options:** `{', '.join(valid_timeframes)}`\n\n**Usage:**\n`!equity [username] [timeframe]`",
+            color=discord.Color.red()
+        )
+        await ctx.send(embed=embed)
+        return
+
+    if username is None:
+        username = ctx.author.name
+
+    equity = await db_async.get_equity_stats(username, timeframe)
+    if equity is None:
+        await ctx.send("Error loading the equity curve, check the bot logs.")
+        return
+    if not equity:
+        await ctx.send(f"No closed trades for {username} ({timeframe}).")
+        return
+
+    embed = discord.Embed(
+        title=f"Equity Curve - {username}",
+        description=f"**Period:** {timeframe.capitalize()} | Closed trades in closing order",
+        color=discord.Color.blue()
+    )
+    for name in ("options", "stocks", "futures"):
+        curve = equity.get(name)
+        if curve is None:
+            continue
+        unit = "pts" if name == "futures" else "%"
+        lines = [
+            f"Cumulative: **{curve['cumulative_pnl']:+.2f}{unit}** (peak {curve['peak']:+.2f}{unit})",
+            f"Max drawdown: -{curve['max_drawdown']:.2f}{unit}",
+        ]
+        if curve["drawdown_end"]:
+            lines[-1] += f" ({curve['drawdown_start'] or 'start'} → {curve['drawdown_end']})"
+        pf = f"{curve['profit_factor']:.2f}" if curve["profit_factor"] is not None else ("∞" if curve["gross_profit"] else "-")
+        lines.append(f"Trades: {curve['trades']} ({curve['wins']}W/{curve['losses']}L) | PF {pf} | Expectancy {curve['expectancy']:+.2f}{unit}")
+        lines.append(f"Losing streak: longest {curve['longest_losing_streak']}, current {curve['current_losing_streak']}")
+        embed.add_field(name=name.capitalize(), value="\n".join(lines), inline=False)
+
+    now_est = datetime.datetime.now(ZoneInfo("America/New_York"))
+    embed.set_footer(text=f"{now_est.strftime('%Y-%m-%d %I:%M %p EST')}\nTrade Tracker Bot")
+    await ctx.send(embed=embed)
+
+LEADERBOARD_SIZE = 10
+
+@bot.command(name="leaderboard", aliases=["lb"])
+async def leaderboard_command(ctx, timeframe: str = "all", metric: str = "pnl"):
+    """
+    Ranks all users over a timeframe.
+
+    Usage:
+        leaderboard [timeframe] [metric]
+
+    Metrics: pnl (options/stocks %), points (futures), winrate, trades
+
+    Examples:
+        leaderboard
+        leaderboard weekly winrate
+    """
+    valid_timeframes = ["today", "weekly", "monthly", "yearly", "all"]
+    valid_metrics = ["pnl", "points", "winrate", "trades"]
+    if timeframe not in valid_timeframes or metric not in valid_metrics:
+        embed = discord.Embed(
+            title="Invalid Parameters",
+            description=f"**Valid timeframes:** `{', '.join(valid_timeframes)}`\n**Valid metrics:** `{', '.join(valid_metrics)}`\n\n**Usage:**\n`!leaderboard [timeframe] [metric]`\n\n**Examples:**\n• `!leaderboard` - all-time total PnL\n• `!leaderboard weekly winrate` - weekly win rate",
+            color=discord.Color.red()
+        )
+        await ctx.send(embed=embed)
+        return
+
+    rows = await db_async.get_leaderboard(timeframe, metric, limit=LEADERBOARD_SIZE)
+    if rows is None:
+        await ctx.send("Error loading the leaderboard, check the bot logs.")
+        return
+
+    lines = []
+    for i, row in enumerate(rows, 1):
+        parts = []
+        if row["pct_count"]:
+            parts.append(f"{row['pnl_pct']:+.2f}%")
+        if row["pts_count"]:
+            parts.append(f"{row['pnl_pts']:+.2f}pts")
+        if row["win_rate"] is not None:
+            parts.append(f"{row['win_rate']:.1f}% WR ({row['wins']}W/{row['losses']}L)")
+        parts.append(f"{row['trades']} trades")
+        lines.append(f"`{i:2d}.` **{row['user']}** · {' · '.join(parts)}")
+
+    if not lines:
+        lines.append("No users ranked yet for this timeframe.")
+        if metric == "winrate":
+            lines.append(f"*Win rate needs at least {LEADERBOARD_MIN_DECIDED} won/lost trades.*")
+
+    embed = discord.Embed(
+        title=f"Leaderboard - {metric.capitalize()}",
+        description=f"**Period:** {timeframe.capitalize()}\n\n" + "\n".join(lines),
+        color=discord.Color.gold()
+    )
+    now_est = datetime.datetime.now(ZoneInfo("America/New_York"))
+    embed.set_footer(text=f"{now_est.strftime('%Y-%m-%d %I:%M %p EST')}\nTrade Tracker Bot")
+    await ctx.send(embed=embed)
+
+# Raíces mostradas por `rolls` sin argumentos
+DEFAULT_ROLL_SYMBOLS = ["/ES", "/NQ", "/CL", "/GC"]
+
+@bot.command(name="rolls")
+async def rolls_command(ctx, *symbols: str):
+    """
+    Shows upcoming futures roll dates (when the front-month contract changes).
+
+    Usage:
+        rolls [symbol ...]
+
+    Examples:
+        rolls
+        rolls /ES /ZN
+    """
+    m = await load_market()
+    now_est = datetime.datetime.now(ZoneInfo("America/New_York"))
+    embed = discord.Embed(title="Futures Rolls", color=discord.Color.blue())
+    for symbol in (symbols or DEFAULT_ROLL_SYMBOLS):
+        symbol = "/" + symbol.upper().lstrip("/")
+        lines = [f"Front: **{m.rolls.front_month(symbol, now_est)}**"]
+        for roll, old, new in m.rolls.upcoming_rolls(symbol, 3, now_est):
+            lines.append(f"{roll.strftime('%Y-%m-%d %I:%M %p')} ET: {old} → {new}")
+        embed.add_field(name=symbol, value="\n".join(lines), inline=False)
+    embed.set_footer(text=f"{now_est.strftime('%Y-%m-%d %I:%M %p EST')}")
+    await ctx.send(embed=embed)
+
+# Discord rejects embed descriptions over 4096 characters
+EMBED_PAGE_CHARS = 4000
+
+async def fetch_expiring_quotes(ticker, date, trades):
+    """Quotes for the strikes held in one underlying/expiration group with a single tasty_data call.
+
+    Returns {(strike, "C"|"P"): quote}.
+    """
+    exp_date = parse_option_date(date)
+    strikes = [float(t["strike"]) for t in trades]
+    options_request = {
+        "tickers": [ticker],
+        "start_date": exp_date,
+        "end_date": exp_date,
+        "lower_strike": str(min(strikes)),
+        "upper_strike": str(max(strikes) + 1),
+        # Solo los strikes abiertos, no todo el rango min..max
+        "strikes": [str(s) for s in sorted(set(strikes))],
+    }
+    m = await load_market()
+    data, _ = await m.tasty.tasty_data(m.session, options_requested=options_request)
+
+    quotes = {}
+    for item in data:
+        for type_opt in ("C", "P"):
+            if is_type_option(item["symbol"], type_opt):
+                key = (float(item["strike"]), type_opt)
+                # Same root choice as order_command
+                if key not in quotes or root_rank(item, ticker) < root_rank(quotes[key], ticker):
+                    quotes[key] = item
+                break
+    return quotes
+
+def paginate_lines(lines, max_chars=EMBED_PAGE_CHARS):
+    """Split lines into pages whose joined text fits in one embed description."""
+    pages, page, size = [], [], 0
+    for line in lines:
+        if page and size + len(line) + 1 > max_chars:
+            pages.append(page)
+            page, size = [], 0
+        page.append(line)
+        size += len(line) + 1
+    if page:
+        pages.append(page)
+    return pages
+
 @tasks.loop(time=datetime.time(hour=16, minute=15, tzinfo=ZoneInfo("America/New_York")))
 async def close_expiring_options():
-    """Close all open options trades expiring on or before today at 16:15 EST."""
+    """Close all open options trades expiring on or before today at 16:15 EST.
+
+    Contracts are grouped by underlying and expiration so each group needs one market-data
+    request, all positions are closed in one DB transaction and a single summary is posted.
+    """
     try:
-        trades = get_open_options_expiring_today()
+        trades = await get_open_options_expiring_today()
         if not trades:
             return  # No trades to close
 
@@ -618,68 +849,60 @@ async def close_expiring_options():
             print("No valid Discord channel found for notifications.")
             return
 
-        for i in range(len(trades)):
-            user = trades[i][0]
-            ticker = trades[i][1]
-            date = trades[i][2]
-            strike = trades[i][3]
-            type_opt = trades[i][4]
-            opening_price = trades[i][5]
-
-            # Fetch the last price from Tastytrade
-            exp_date = parse_option_date(date)
-            options_request = {
-                "tickers": [ticker],
-                "start_date": exp_date,
-                "end_date": exp_date,
-                "lower_strike": str(strike),
-                "upper_strike": str(float(strike) + 1)
-            }
-            data, _ = await tasty_data(session, options_requested=options_request)
+        groups = {}
+        for trade in trades:
+            groups.setdefault((trade["ticker"], trade["date"]), []).append(trade)
 
-            def is_type_option(symbol: str, type_option: str) -> bool:
-                i = len(symbol) - 1
-                while i >= 0 and symbol[i].isdigit():
-                    i -= 1
-                suffix = symbol[i:].lower()
-                return type_option.lower() in suffix
+        group_quotes = await asyncio.gather(
+            *[fetch_expiring_quotes(ticker, date, group) for (ticker, date), group in groups.items()],
+            return_exceptions=True
+        )
 
-            
-            match = next((item for item in data if str(strike) in item["strike"] and is_type_option(item["symbol"], type_option)), None)
-            if not match:
-                print(f"Option {ticker} {date} {strike}{type_opt} not found in Tastytrade.")
-                closing_price = 0
-                market = "0.00"
-            else:
-                closing_price = match.get("last")
-                if closing_price == "None":
-                    closing_price = float(match.get("mid"))
+        closures = []
+        for ((ticker, date), group), quotes in zip(groups.items(), group_quotes):
+            if isinstance(quotes, Exception):
+                # Leave them open: the next run (or the startup check) retries
+                print(f"Error fetching {ticker} {date} quotes, {len(group)} trades left open: {quotes}")
+                continue
+            for trade in group:
+                match = quotes.get((float(trade["strike"]), trade["type"]))
+                if not match:
+                    print(f"Option {ticker} {date} {trade['strike']}{trade['type']} not found in Tastytrade.")
+                    closing_price = 0
                 else:
-                    closing_price = float(closing_price)
-                market = "{:.2f}".format(float(match.get("mid")))
+                    closing_price = match.get("last")
+                    if closing_price == "None":
+                        closing_price = float(match.get("mid"))
+                    else:
+                        closing_price = float(closing_price)
+                closures.append((trade["user"], ticker, closing_price, date, trade["strike"], trade["type"]))
+
+        if not closures:
+            return
 
-            # Close the trade
-            result = close_trade(user, ticker, closing_price, date, strike, type_opt)
+        results = await close_trades(closures)
+        if results is None:
+            print("Failed to close expiring trades, the transaction was rolled back.")
+            return
+
+        lines = []
+        for (user, ticker, _, date, strike, type_opt), result in zip(closures, results):
             if result is None:
                 print(f"Failed to close trade {ticker} {date} {strike}{type_opt} for {user}.")
                 continue
-
-            # Send notification
             avg_entry_price, closing_price = result
-            command = "STC"
-            direction_label, is_long = get_order_direction(command)
-            embed = build_embed(
-                None,  # No ctx, system-initiated
-                ticker,
-                closing_price,
-                market,
-                direction_label,
-                extra=f"{date} {strike}{type_opt}",
-                is_long=is_long,
-                avg_entry_price=avg_entry_price,
-                closing_price=closing_price
-            )
-            await channel.send(f"{command} {ticker} {date} {strike}{type_opt} @ {closing_price:.2f}")
+            pnl = format_pnl(avg_entry_price, closing_price, ticker)
+            lines.append(f"**{user}**: STC {ticker} {date} {strike}{type_opt} @ {closing_price:.2f} "
+                         f"(Avg Entry: {avg_entry_price:.2f} | PnL: **{pnl}**)")
+
+        pages = paginate_lines(lines)
+        now_est = datetime.datetime.now(ZoneInfo("America/New_York"))
+        for page_number, page in enumerate(pages, 1):
+            title = f"Expired options closed ({len(lines)})"
+            if len(pages) > 1:
+                title += f" {page_number}/{len(pages)}"
+            embed = discord.Embed(title=title, description="\n".join(page), color=discord.Color.blue())
+            embed.set_footer(text=f"{now_est.strftime('%Y-%m-%d %I:%M %p EST')}\nTrade Tracker Bot by jinskukripta")
             await channel.send(embed=embed)
 
     except Exception as e:
@@ -703,12 +926,25 @@ async def on_command_error(ctx, error):
     else:
         raise error
 
+# Trades leave the leaderboard windows (today/weekly/...) only when they are recomputed
+@tasks.loop(minutes=5)
+async def refresh_leaderboard():
+    if await db_async.refresh_leaderboard() is None:
+        print("Leaderboard refresh failed, retrying on the next run")
+
 @bot.event
 async def on_ready():
     print(f"Logged in {bot.user}")
+    m = await load_market()
+    await m.tasty.streamer_manager.start(m.session)
     print("Verificando trades expirados al inicio...")
     await close_expiring_options()
     if not close_expiring_options.is_running():
         close_expiring_options.start()
+    if not refresh_leaderboard.is_running():
+        refresh_leaderboard.start()
 
-bot.run(DISCORD_TOKEN)
+if __name__ == "__main__":
+    initialize_db()
+    bot.run(DISCORD_TOKEN)
+    db_async.shutdown()
@@ -3,16 +3,19 @@ trading_hours.py - Validación de horarios de mercado para Wall Street y CME
 """
 from datetime import datetime, time
 from zoneinfo import ZoneInfo
-import holidays
+from functools import lru_cache
 
-# Festivos de Estados Unidos
-US_HOLIDAYS = holidays.US()
+@lru_cache(maxsize=1)
+def us_holidays():
+    """Festivos de Estados Unidos (el paquete holidays se importa en el primer uso)"""
+    import holidays
+    return holidays.US()
 
 def is_us_market_holiday(date=None):
     """Verifica si es un día festivo del mercado estadounidense"""
     if date is None:
         date = datetime.now(ZoneInfo("America/New_York")).date()
-    return date in US_HOLIDAYS
+    return date in us_holidays()
 
 def is_weekend(date=None):
     """Verifica si es fin de semana"""
@@ -42,7 +45,7 @@ def is_options_market_open():
     
     # Check for holidays
     if is_us_market_holiday(current_date):
-        holiday_name = US_HOLIDAYS.get(current_date)
+        holiday_name = us_holidays().get(current_date)
         return False, f"❌ Market is closed for {holiday_name}. Opens next business day at 9:30 AM ET."
     
     # Trading hours: 9:30 AM - 4:00 PM ET
@@ -117,7 +120,7 @@ def is_stock_market_open():
     
     # Check for holidays
     if is_us_market_holiday(current_date):
-        holiday_name = US_HOLIDAYS.get(current_date)
+        holiday_name = us_holidays().get(current_date)
         return False, f"❌ Market is closed for {holiday_name}. Opens next business day at 9:30 AM ET."
     
     # Trading hours: 9:30 AM - 4:00 PM ET
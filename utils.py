@@ -2,9 +2,6 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-from calendar import monthrange
-from cachetools import TTLCache
-import cachetools
 from pathlib import Path
 from os import getcwd, makedirs, path
 from re import compile
@@ -29,24 +26,104 @@ def get_friday_of_this_week():
     return friday.strftime("%Y %b %d")
 
 
-@cachetools.cached(cache=TTLCache(maxsize=16, ttl=60 * 60 * 4))  # in-memory cache for 4 hrs
+class SessionCalendar:
+    """
+    Sesiones de un mercado (XNYS por defecto) construidas una sola vez por proceso.
+
+    Las sesiones se guardan como un array ordenado de datetime64[D] (búsqueda binaria para
+    siguiente/anterior/N-ésima sesión) y un set de fechas (pertenencia O(1)). El rango cubre
+    `years_back`/`years_ahead` años alrededor de hoy y se amplía solo si una consulta se sale.
+    """
+
+    def __init__(self, exchange: str = "XNYS", years_back: int = 1, years_ahead: int = 2):
+        self.exchange = exchange
+        self.years_back = years_back
+        self.years_ahead = years_ahead
+        self._sessions = None
+        self._set = None
+        self._start = self._end = None
+
+    def _build(self, start: datetime.date, end: datetime.date):
+        calendar = xcals.get_calendar(self.exchange, start=start, end=end)
+        self._sessions = calendar.sessions.values.astype("datetime64[D]")
+        self._set = set(self._sessions.astype(object))
+        self._start, self._end = start, end
+
+    def _ensure(self, date: datetime.date, margin: int = 40):
+        """Build (or widen) the calendar so that `date` ± margin days is covered."""
+        if self._sessions is None:
+            today = datetime.date.today()
+            self._build(
+                datetime.date(today.year - self.years_back, 1, 1),
+                datetime.date(today.year + self.years_ahead, 12, 31),
+            )
+        lo, hi = date - timedelta(days=margin), date + timedelta(days=margin)
+        if lo < self._start or hi > self._end:
+            self._build(min(lo, self._start), max(hi, self._end))
+
+    @staticmethod
+    def _as_date(date) -> datetime.date:
+        return date.date() if isinstance(date, datetime.datetime) else date
+
+    def is_session(self, date) -> bool:
+        date = self._as_date(date)
+        self._ensure(date)
+        return date in self._set
+
+    def next_session(self, date, n: int = 1) -> datetime.date:
+        """N-th session strictly after `date`."""
+        date = self._as_date(date)
+        self._ensure(date, margin=40 + 2 * n)
+        i = np.searchsorted(self._sessions, np.datetime64(date, "D"), side="right")
+        return self._sessions[i + n - 1].astype(object)
+
+    def previous_session(self, date, n: int = 1) -> datetime.date:
+        """N-th session strictly before `date`."""
+        date = self._as_date(date)
+        self._ensure(date, margin=40 + 2 * n)
+        i = np.searchsorted(self._sessions, np.datetime64(date, "D"), side="left")
+        return self._sessions[i - n].astype(object)
+
+    def session_on_or_after(self, date) -> datetime.date:
+        date = self._as_date(date)
+        return date if self.is_session(date) else self.next_session(date)
+
+    def month_sessions(self, year: int, month: int) -> np.ndarray:
+        first = datetime.date(year, month, 1)
+        self._ensure(first)
+        lo = np.searchsorted(self._sessions, np.datetime64(first, "D"), side="left")
+        hi = np.searchsorted(self._sessions, np.datetime64(first, "M") + 1, side="left")
+        return self._sessions[lo:hi]
+
+    def month_end(self, year: int, month: int) -> datetime.date:
+        """Last session of the month."""
+        return self.month_sessions(year, month)[-1].astype(object)
+
+    def third_friday(self, year: int, month: int):
+        """Third-Friday session of the month, the Thursday before if Friday is a holiday, or None."""
+        first = datetime.date(year, month, 1)
+        friday = first + timedelta(days=(4 - first.weekday()) % 7 + 14)
+        if self.is_session(friday):
+            return friday
+        thursday = friday - timedelta(days=1)
+        return thursday if self.is_session(thursday) else None
+
+
+trading_calendar = SessionCalendar()
+
+
 def is_third_friday(date, tz):
+    """
+    Vencimiento mensual (tercer viernes, o jueves si el viernes es festivo) a las 16:00 en `tz`
+    del mes de `date`, o del siguiente si ya pasó; junto con las sesiones de ese mes.
+    """
     def get_third_friday_or_thursday(year, month, tz):
-        _, last = monthrange(year, month)
-        first = datetime.datetime(year, month, 1)
-        last = datetime.datetime(year, month, last)
-        result = xcals.get_calendar("XNYS", start=first, end=last)
-        result = result.sessions.to_pydatetime()
-
-        found = [None, None]
-        for i in result:
-            if i.weekday() == 4 and 15 <= i.day <= 21 and i.month == month:
-                # Third Friday
-                found[0] = i.replace(tzinfo=ZoneInfo(tz)) + timedelta(hours=16)
-            elif i.weekday() == 3 and 15 <= i.day <= 21 and i.month == month:
-                # Thursday alternative
-                found[1] = i.replace(tzinfo=ZoneInfo(tz)) + timedelta(hours=16)
-        return found[0] or found[1], result
+        result = [datetime.datetime.combine(d, datetime.time()) for d in
+                  trading_calendar.month_sessions(year, month).astype(object)]
+        found = trading_calendar.third_friday(year, month)
+        if found is not None:
+            found = datetime.datetime.combine(found, datetime.time(16, 0), tzinfo=ZoneInfo(tz))
+        return found, result
 
     # Intentamos con el mes actual
     candidate, result = get_third_friday_or_thursday(date.year, date.month, tz)
@@ -68,18 +145,9 @@ def expir_to_datetime(expir: str):
 
     expir = expir.lower().strip()
 
-    _, last = monthrange(today.year, today.month)
-    first = datetime.datetime(today.year, today.month, 1)
-    last = datetime.datetime(today.year, today.month, last)
-    calendar = xcals.get_calendar("XNYS", start=first, end=last)
-    trading_days = calendar.sessions.to_pydatetime()
-    trading_dates = [d.date() for d in trading_days]
-
     if expir == "0dte":
         # Si el mercado está abierto hoy, devolvemos hoy
-        
-
-        if today_date in trading_dates:
+        if trading_calendar.is_session(today_date):
             return today_date
         else:
             return next_open_day(today_date)
@@ -98,16 +166,9 @@ def expir_to_datetime(expir: str):
         # Buscar viernes de esta semana
         this_friday = today_date + datetime.timedelta((4 - today_date.weekday()) % 7)
 
-        _, last = monthrange(this_friday.year, this_friday.month)
-        first = datetime.datetime(this_friday.year, this_friday.month, 1)
-        last = datetime.datetime(this_friday.year, this_friday.month, last)
-        calendar = xcals.get_calendar("XNYS", start=first, end=last)
-        trading_days = calendar.sessions.to_pydatetime()
-        trading_dates = [d.date() for d in trading_days]
-
-        if this_friday in trading_dates:
+        if trading_calendar.is_session(this_friday):
             return this_friday
-        elif (this_friday - datetime.timedelta(days=1)) in trading_dates:
+        elif trading_calendar.is_session(this_friday - datetime.timedelta(days=1)):
             return this_friday - datetime.timedelta(days=1)
         else:
             raise ValueError("Ni viernes ni jueves son días hábiles esta semana.")
@@ -118,7 +179,7 @@ def expir_to_datetime(expir: str):
         return date_.date()
 
     elif expir == "monthly":
-        return trading_dates[-1]
+        return trading_calendar.month_end(today.year, today.month)
 
     else:
         raise ValueError(f"Tipo de expiración desconocido: {expir}")
@@ -130,17 +191,7 @@ def next_open_day(date):
     hour = now_europe.hour
     days_to_add = 2 if 22 <= hour <= 23 else 1
     next_day = date + datetime.timedelta(days=days_to_add)
-
-    _, last = monthrange(next_day.year, next_day.month)
-    first = datetime.datetime(next_day.year, next_day.month, 1)
-    last = datetime.datetime(next_day.year+1, next_day.month, last)
-    calendar = xcals.get_calendar("XNYS", start=first, end=last)
-    trading_days = calendar.sessions.to_pydatetime()
-    trading_dates = [d.date() for d in trading_days]
-
-    while next_day not in trading_dates:
-        next_day += datetime.timedelta(days=1)
-    return next_day
+    return trading_calendar.session_on_or_after(next_day)
 
 def is_parsable(date):
     try:
@@ -149,77 +200,67 @@ def is_parsable(date):
     except ValueError:
         return False
 
+FORMAT_COLUMNS = [
+    "calls", "call_iv", "call_open_int", "call_delta", "call_gamma",
+    "puts", "put_iv", "put_open_int", "put_delta", "put_gamma",
+    "strike_price", "expiration_date", "time_till_exp"
+]
+# Campo del downloader -> sufijo de columna (call_iv, put_open_int, ...)
+_FORMAT_FIELDS = {"vol": "iv", "open_interest": "open_int", "delta": "delta", "gamma": "gamma"}
+
+
 def format_data(gr_list, today_ddt):
-    import pandas as pd
-    import numpy as np
-    import datetime
-
-    columns = [
-        "calls", "call_iv", "call_open_int", "call_delta", "call_gamma",
-        "puts", "put_iv", "put_open_int", "put_delta", "put_gamma",
-        "strike_price", "expiration_date", "time_till_exp"
-    ]
-
-    grouped = {}
-
-    for option in gr_list:
-        strike = float(option["strike"])
-        raw_expiration = pd.to_datetime(option["expiration"])
-        expiration = pd.Timestamp(
-            datetime.datetime.combine(raw_expiration, datetime.time(16, 0))
-        ).tz_localize("America/New_York")
-
-        # Usamos una base común eliminando solo la letra final C/P
-        option_code = str(option["option"]).replace(' ', '')
-        option_base = option_code[:-9] + option_code[-8:]  # elimina la C/P (ej: SPXW25071806250000)
-
-        if "/" in option_base:
-            option_base = option_base.replace("C", '')
-            option_base = option_base.replace("P", '')
-
-        key = (option_base, strike, expiration)
-
-        if key not in grouped:
-            grouped[key] = {
-                "strike_price": strike,
-                "expiration_date": expiration,
-                "time_till_exp": None,  # se completará luego
-                "calls": None,
-                "call_iv": None,
-                "call_open_int": None,
-                "call_delta": None,
-                "call_gamma": None,
-                "puts": None,
-                "put_iv": None,
-                "put_open_int": None,
-                "put_delta": None,
-                "put_gamma": None,
-            }
-
-        is_call = "C" in option["option"]
-
-        if is_call:
-            grouped[key]["calls"] = option_code
-            grouped[key]["call_iv"] = float(option.get("vol", 0))
-            grouped[key]["call_open_int"] = float(option.get("open_interest", 0))
-            grouped[key]["call_delta"] = float(option.get("delta", 0))
-            grouped[key]["call_gamma"] = float(option.get("gamma", 0))
-        else:
-            grouped[key]["puts"] = option_code
-            grouped[key]["put_iv"] = float(option.get("vol", 0))
-            grouped[key]["put_open_int"] = float(option.get("open_interest", 0))
-            grouped[key]["put_delta"] = float(option.get("delta", 0))
-            grouped[key]["put_gamma"] = float(option.get("gamma", 0))
-
-    # Crear DataFrame
-    option_data = pd.DataFrame(grouped.values(), columns=columns)
+    """
+    Call/put surface (one row per underlying root, strike and expiration) from the options
+    of tasty_data: the legacy list of dicts or an OptionSurface. Built with whole-column
+    operations; missing fields count as 0.
+    """
+    if hasattr(gr_list, "to_frame"):
+        frame = gr_list.to_frame().reset_index(drop=True)[["option", "strike", "expiration", *_FORMAT_FIELDS]]
+        frame[list(_FORMAT_FIELDS)] = frame[list(_FORMAT_FIELDS)].fillna(0)
+    else:
+        frame = pd.DataFrame.from_records(gr_list, columns=["option", "strike", "expiration", *_FORMAT_FIELDS])
+        for field in _FORMAT_FIELDS:
+            # Ausente -> 0, como option.get(field, 0)
+            frame[field] = pd.to_numeric(frame[field].fillna(0), errors="coerce")
+
+    if frame.empty:
+        return pd.DataFrame(columns=FORMAT_COLUMNS)
+
+    option_code = frame["option"].astype(str).str.replace(" ", "", regex=False)
+    # Base común eliminando solo la letra C/P (ej: SPXW25071806250000)
+    option_base = option_code.str[:-9] + option_code.str[-8:]
+    futures = option_base.str.contains("/", regex=False)
+    if futures.any():
+        option_base[futures] = option_base[futures].str.replace("C", "", regex=False).str.replace("P", "", regex=False)
+
+    expiration = (pd.to_datetime(frame["expiration"]) + pd.Timedelta(hours=16)).dt.tz_localize("America/New_York")
+
+    frame = pd.DataFrame({
+        "option_base": option_base,
+        "strike_price": frame["strike"].astype(float),
+        "expiration_date": expiration,
+        "code": option_code,
+        "is_call": frame["option"].astype(str).str.contains("C", regex=False),
+        **{field: frame[field].astype(float) for field in _FORMAT_FIELDS},
+    })
+    key = ["option_base", "strike_price", "expiration_date"]
+
+    option_data = frame[key].drop_duplicates()
+    for is_call, side, code_column in ((True, "call", "calls"), (False, "put", "puts")):
+        # Si se repite un contrato, gana el último (como al sobrescribir el dict)
+        legs = frame[frame["is_call"] == is_call].drop_duplicates(subset=key, keep="last")
+        legs = legs.rename(columns={"code": code_column, **{f: f"{side}_{c}" for f, c in _FORMAT_FIELDS.items()}})
+        option_data = option_data.merge(
+            legs[key + [code_column] + [f"{side}_{c}" for c in _FORMAT_FIELDS.values()]], on=key, how="left")
+
     # Calcular DTE (sin zona horaria)
-    expiration_dates = pd.to_datetime(option_data["expiration_date"].dt.tz_localize(None)).values.astype("datetime64[D]")
+    expiration_dates = option_data["expiration_date"].dt.tz_localize(None).values.astype("datetime64[D]")
     busday_counts = np.busday_count(today_ddt.date(), expiration_dates)
     option_data["time_till_exp"] = np.where(busday_counts == 0, 1 / 252, busday_counts / 252)
 
     # Ordenar
-    option_data = option_data.sort_values(by=["expiration_date", "strike_price"]).reset_index(drop=True)
+    option_data = option_data[FORMAT_COLUMNS].sort_values(by=["expiration_date", "strike_price"]).reset_index(drop=True)
 
     return option_data
 
@@ -395,99 +436,12 @@ def get_SOFR_ticker():
 
 
 def get_future_ticker(symbol: str, current_date: datetime.datetime = None, monthly: bool = None, tz: str = "America/New_York") -> str:
-    """
-    Devuelve el ticker de futuros siguiente a la fecha actual para el símbolo dado.
-    - Detecta automáticamente si el contrato es mensual o trimestral según el símbolo.
-    - Acepta símbolos con o sin prefijo "/".
-    - Si `monthly` se especifica, sobrescribe la detección automática.
-    """
-    if current_date is None:
-        current_date = datetime.datetime.now(ZoneInfo(tz))
-
-    symbol = symbol.upper().lstrip("/")  # elimina prefijo "/" si existe
-    is_GC = False
-    # Contratos con vencimientos mensuales
-    monthly_contracts = {
-        'CL', 'QM', 'BZ',      # Petróleo
-        'NG', 'QG',            # Gas natural
-        'GC', 'HG', 'PL',      # Metales
-        'VX',                  # Volatilidad
-        'ZT', 'ZF', 'ZN', 'ZB',# Bonos
-        'SR3',                 # RBA
-        'BTC', 'ETH'           # Criptos
-    }
-
-    # Si monthly no está especificado, se detecta automáticamente
-    if monthly is None:
-        monthly = symbol in monthly_contracts
-
-    month_codes = {
-        1: 'F', 2: 'G', 3: 'H', 4: 'J', 5: 'K', 6: 'M',
-        7: 'N', 8: 'Q', 9: 'U', 10: 'V', 11: 'X', 12: 'Z'
-    }
-
-    if monthly:
-        # usar is_third_friday para decidir +1 o +2 meses
-        this_third_friday, _ = is_third_friday(current_date, tz)
-        if current_date > this_third_friday:
-            next_month = current_date.month + 2
-        else:
-            next_month = this_third_friday.month + 1
-
-        year = current_date.year
-        if next_month > 12:
-            next_month -= 12
-            year += 1
-        if is_GC:
-            next_month += 2
-
-        code = month_codes[next_month]
-
-    else:
-        quarterly_months = [3, 6, 9, 12]
-        year = current_date.year
-        for m in quarterly_months:
-            # tercer viernes del mes
-            first_day = datetime.datetime(year, m, 1)
-            weekday = first_day.weekday()
-            delta = (4 - weekday + 7) % 7
-            third_friday = 1 + delta + 14
-            opex = datetime.datetime(year, m, third_friday)
-            opex = opex.replace(tzinfo=ZoneInfo(tz))
-            if current_date < opex:
-                code = month_codes[m]
-                break
-        else:
-            year += 1
-            code = month_codes[3]  # marzo siguiente año
-
-    year_code = str(year)[-1]
-    symbol = '/' + symbol
-    return f"{symbol}{code}{year_code}"
-
+    """Contrato frontal de `symbol` en `current_date` (ver futures_roll.front_month)."""
+    from futures_roll import front_month
+    return front_month(symbol, current_date, monthly, tz)
 
 
 def extract_base_symbol(future_ticker: str) -> str:
-    """
-    Extrae el símbolo base desde un ticker de futuros (e.g., '/ESU5' → '/ES').
-
-    Detecta automáticamente el símbolo base eliminando el código de mes y año.
-    """
-    # Tabla de códigos de mes de futuros
-    month_codes = {'F', 'G', 'H', 'J', 'K', 'M', 'N', 'Q', 'U', 'V', 'X', 'Z'}
-
-    ticker = future_ticker.strip().upper()
-
-    # Buscar código de mes y año en las últimas posiciones
-    if len(ticker) < 3:
-        raise ValueError(f"Ticker demasiado corto: {ticker}")
-
-    # Recorrer desde el final hacia atrás para detectar patrón válido
-    for i in range(len(ticker) - 2, 0, -1):
-        if ticker[i] in month_codes and ticker[i+1].isdigit():
-            return ticker[:i]  # Devuelve todo lo anterior al mes
-
-    raise ValueError(f"No se pudo extraer símbolo base de: {ticker}")
-
-
-
+    """'/ESU5' -> '/ES' (ver futures_roll.extract_base_symbol)."""
+    from futures_roll import extract_base_symbol
+    return extract_base_symbol(future_ticker)